@@ -0,0 +1,16 @@
+# ===============================
+# api/urls.py
+# ===============================
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('search/units/', views.UnitSearchView.as_view(), name='unit-search'),
+    path('qualifications/<str:code>/units/', views.QualificationUnitsView.as_view(), name='qualification-units'),
+    path('units/<str:code>/qualifications/', views.UnitQualificationsView.as_view(), name='unit-qualifications'),
+    path('packages/', views.PackageListView.as_view(), name='package-list'),
+    path('packages/<int:pk>/curriculum/', views.CurriculumView.as_view(), name='package-curriculum'),
+    path('leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', views.LeaderboardPositionView.as_view(), name='leaderboard-position'),
+    path('awards/bulk/', views.BulkAwardView.as_view(), name='bulk-award'),
+]
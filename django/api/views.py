@@ -1,3 +1,187 @@
-from django.shortcuts import render
+# ===============================
+# api/views.py
+# ===============================
+from django.conf import settings
+from gamification import leaderboard
+from gamification.models import Achievement
+from gamification.services import bulk_award
+from profiles.models import UserProfile
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from training_data.curriculum import get_curriculum
+from training_data.models import TrainingPackage
+from training_data.packaging import qualifications_for_unit, units_for_qualification
+from training_data.search import search_units
+from training_data.stats import packages_with_stats
 
-# Create your views here.
+class UnitSearchView(APIView):
+    """
+    GET /api/search/units/?q=food+safety&page=1
+    Ranked keyword search over units of competency, matching word prefixes
+    in unit titles, element and performance criteria text.
+    """
+
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+        except ValueError:
+            page = 1
+        page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+
+        count, results = search_units(text, limit=page_size, offset=(page - 1) * page_size)
+        return Response({
+            'query': text,
+            'count': count,
+            'page': page,
+            'results': results
+        })
+
+class QualificationUnitsView(APIView):
+    """GET /api/qualifications/<code>/units/ - the core and elective units packaged in a qualification"""
+
+    def get(self, request, code):
+        units = units_for_qualification(code)
+        if not units:
+            raise NotFound(f"No units found for qualification {code}")
+        return Response({'qualification': code, 'count': len(units), 'units': units})
+
+class UnitQualificationsView(APIView):
+    """GET /api/units/<code>/qualifications/ - every qualification that includes a unit"""
+
+    def get(self, request, code):
+        qualifications = qualifications_for_unit(code)
+        if not qualifications:
+            raise NotFound(f"No qualifications include unit {code}")
+        return Response({'unit': code, 'count': len(qualifications), 'qualifications': qualifications})
+
+class CurriculumView(APIView):
+    """
+    GET /api/packages/<pk>/curriculum/ - a training package with its units in order
+    Served from the cache; send the returned ETag as If-None-Match to get a 304
+    while the curriculum is unchanged.
+    """
+
+    def get(self, request, pk):
+        try:
+            curriculum = get_curriculum(pk)
+        except TrainingPackage.DoesNotExist:
+            raise NotFound(f"No training package {pk}")
+
+        headers = {'ETag': curriculum['etag']}
+        if_none_match = request.headers.get('If-None-Match', '')
+        if curriculum['etag'] in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(curriculum['data'], headers=headers)
+
+class PackageListView(APIView):
+    """GET /api/packages/ - every active training package with its unit count, points and duration"""
+
+    def get(self, request):
+        packages = []
+        for package in packages_with_stats().filter(is_active=True):
+            stats = getattr(package, 'stats', None)
+            packages.append({
+                'id': package.pk,
+                'name': package.name,
+                'difficulty_level': package.difficulty_level,
+                'unit_count': stats.unit_count if stats else 0,
+                'total_points': stats.total_points if stats else 0,
+                'total_duration': stats.total_duration if stats else None,
+            })
+        return Response({'count': len(packages), 'packages': packages})
+
+# Most entries returned by the leaderboard endpoints
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_MAX_RADIUS = 25
+
+def _leaderboard_params(request, name, default, maximum):
+    board = request.query_params.get('board', 'points')
+    if board not in leaderboard.BOARDS:
+        raise ValidationError({'board': f"Choose one of: {', '.join(leaderboard.BOARDS)}"})
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        value = default
+    return board, min(max(1, value), maximum)
+
+def _with_names(entries):
+    """Add each entry's username and character name, in one query"""
+    names = {
+        user_id: (username, character_name)
+        for user_id, username, character_name in UserProfile.objects.filter(
+            user_id__in=[entry['user_id'] for entry in entries]
+        ).values_list('user_id', 'user__username', 'character_name')
+    }
+    return [
+        dict(entry, username=names[entry['user_id']][0], character_name=names[entry['user_id']][1])
+        for entry in entries if entry['user_id'] in names
+    ]
+
+class LeaderboardView(APIView):
+    """GET /api/leaderboard/?board=points&limit=10 - the top of a leaderboard (points or experience)"""
+
+    def get(self, request):
+        board, limit = _leaderboard_params(request, 'limit', 10, LEADERBOARD_MAX_LIMIT)
+        return Response({
+            'board': board,
+            'size': leaderboard.size(board),
+            'results': _with_names(leaderboard.top(board, limit))
+        })
+
+class LeaderboardPositionView(APIView):
+    """GET /api/leaderboard/me/?board=points&radius=5 - the current user's rank and the users either side"""
+
+    def get(self, request):
+        board, radius = _leaderboard_params(request, 'radius', 5, LEADERBOARD_MAX_RADIUS)
+        position = leaderboard.rank(board, request.user.pk)
+        if position is None:
+            raise NotFound("You are not on this leaderboard yet")
+        return Response({
+            'board': board,
+            'rank': position['rank'],
+            'score': position['score'],
+            'nearby': _with_names(leaderboard.around(board, request.user.pk, radius))
+        })
+
+# Most users one bulk award request may name
+BULK_AWARD_MAX_USERS = 50000
+
+class BulkAwardView(APIView):
+    """
+    POST /api/awards/bulk/ (staff only)
+    {"user_ids": [...], "points": 25, "description": "Cohort bonus", "achievement_id": 3}
+    Awards bonus points and/or an achievement to every listed user, in batches.
+    Responds with the totals and each batch's timing.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        data = request.data
+        user_ids = data.get('user_ids')
+        if not isinstance(user_ids, list) or not user_ids:
+            raise ValidationError({'user_ids': "A non-empty list of user ids is required"})
+        if len(user_ids) > BULK_AWARD_MAX_USERS:
+            raise ValidationError({'user_ids': f"At most {BULK_AWARD_MAX_USERS} users per request"})
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+            points = int(data.get('points') or 0)
+        except (TypeError, ValueError):
+            raise ValidationError("user_ids and points must be integers")
+        if points < 0:
+            raise ValidationError({'points': "Bonus points cannot be negative"})
+
+        achievement = None
+        if data.get('achievement_id') is not None:
+            try:
+                achievement = Achievement.objects.get(pk=data['achievement_id'], is_active=True)
+            except (Achievement.DoesNotExist, ValueError, TypeError):
+                raise ValidationError({'achievement_id': "No active achievement with that id"})
+        if not points and achievement is None:
+            raise ValidationError("Give points, an achievement_id, or both")
+
+        description = str(data.get('description') or 'Bonus')[:200]
+        return Response(bulk_award(user_ids, points, description, achievement))
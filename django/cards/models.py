@@ -3,6 +3,7 @@
 # ===============================
 from django.contrib.auth.models import User
 from django.db import models
+from model_utils import FieldTracker
 from model_utils.models import TimeStampedModel
 
 class Card(TimeStampedModel):
@@ -28,5 +29,8 @@ class UserCard(TimeStampedModel):
     card = models.ForeignKey(Card, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
     
+    # Lets gamification count only the cards gained by each save
+    tracker = FieldTracker(fields=['quantity'])
+    
     class Meta:
         unique_together = ['user', 'card']
\ No newline at end of file
@@ -0,0 +1,144 @@
+# ===============================
+# gamification/leaderboard.py
+# ===============================
+# Leaderboards kept as Redis sorted sets (member: user id, score: points), so
+# top-N, a user's rank and the users around them are O(log n) reads instead
+# of ORDER BY plus COUNT over UserProfile. The sets mirror UserProfile:
+# services.py refreshes the users it changes once their transaction commits,
+# and `manage.py rebuild_leaderboard` reloads everything from the database.
+import logging
+import redis
+from django.conf import settings
+from profiles.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Leaderboard name -> UserProfile field it ranks by
+BOARDS = {
+    'points': 'total_points',
+    'experience': 'experience_points',
+}
+
+KEY_PREFIX = 'leaderboard'
+
+# Profiles loaded per query and written per pipeline by rebuild()
+REBUILD_CHUNK_SIZE = 5000
+
+_client = None
+
+def get_client():
+    """Redis client for LEADERBOARD_REDIS_URL, defaulting to the cache's Redis"""
+    global _client
+    if _client is None:
+        url = getattr(settings, 'LEADERBOARD_REDIS_URL', None) or settings.CACHES['default']['LOCATION']
+        _client = redis.Redis.from_url(url)
+    return _client
+
+def board_key(board):
+    if board not in BOARDS:
+        raise ValueError(f"Unknown leaderboard {board!r}")
+    return f"{KEY_PREFIX}:{board}"
+
+def record_profiles(user_ids):
+    """
+    Copy the current scores of the given users into every board. Scores are
+    read back from UserProfile rather than applied as deltas, so a missed
+    update is repaired by the next one. Redis errors are logged, not raised:
+    a stale leaderboard must not fail the change that triggered it.
+    """
+    rows = UserProfile.objects.filter(user_id__in=list(user_ids)).values_list('user_id', *BOARDS.values())
+    mappings = {board: {} for board in BOARDS}
+    for user_id, *scores in rows:
+        for board, score in zip(BOARDS, scores):
+            mappings[board][user_id] = score
+    try:
+        client = get_client()
+        _add_scores(client, {board: board_key(board) for board in BOARDS}, mappings)
+    except redis.RedisError:
+        logger.exception("Could not update leaderboards for users %s", user_ids)
+
+def remove_users(user_ids):
+    """Take users off every board"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        for board in BOARDS:
+            pipe.zrem(board_key(board), *user_ids)
+        pipe.execute()
+    except redis.RedisError:
+        logger.exception("Could not remove users %s from the leaderboards", user_ids)
+
+def _ranked(rows, first_rank):
+    """[(user_id, score)] from ZREVRANGE ... WITHSCORES as dicts with 1-based ranks"""
+    return [
+        {'rank': first_rank + offset, 'user_id': int(member), 'score': int(score)}
+        for offset, (member, score) in enumerate(rows)
+    ]
+
+def top(board, count=10):
+    """The count highest scores, best first"""
+    rows = get_client().zrevrange(board_key(board), 0, count - 1, withscores=True)
+    return _ranked(rows, 1)
+
+def rank(board, user_id):
+    """Dict: {'rank', 'user_id', 'score'} for a user (rank 1 is the top), or None if not on the board"""
+    pipe = get_client().pipeline(transaction=False)
+    pipe.zrevrank(board_key(board), user_id)
+    pipe.zscore(board_key(board), user_id)
+    position, score = pipe.execute()
+    if position is None:
+        return None
+    return {'rank': position + 1, 'user_id': user_id, 'score': int(score)}
+
+def around(board, user_id, radius=5):
+    """Up to radius users either side of a user, best first; empty if the user is not on the board"""
+    position = get_client().zrevrank(board_key(board), user_id)
+    if position is None:
+        return []
+    start = max(0, position - radius)
+    rows = get_client().zrevrange(board_key(board), start, position + radius, withscores=True)
+    return _ranked(rows, start + 1)
+
+def size(board):
+    return get_client().zcard(board_key(board))
+
+def _add_scores(client, keys, mappings):
+    """One ZADD per board for the buffered {user_id: score} mappings, then clear them"""
+    pipe = client.pipeline(transaction=False)
+    for board, mapping in mappings.items():
+        if mapping:
+            pipe.zadd(keys[board], mapping)
+            mapping.clear()
+    pipe.execute()
+
+def rebuild(chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Reload every board from UserProfile. Each board is built under a temporary
+    key and renamed over the live one, so readers never see a half-built board.
+    Returns the number of profiles loaded.
+    """
+    client = get_client()
+    building = {board: f"{board_key(board)}:rebuild" for board in BOARDS}
+    client.delete(*building.values())
+
+    loaded = 0
+    mappings = {board: {} for board in BOARDS}
+    rows = UserProfile.objects.order_by().values_list('user_id', *BOARDS.values()).iterator(chunk_size=chunk_size)
+    for user_id, *scores in rows:
+        for board, score in zip(BOARDS, scores):
+            mappings[board][user_id] = score
+        loaded += 1
+        if loaded % chunk_size == 0:
+            _add_scores(client, building, mappings)
+    _add_scores(client, building, mappings)
+
+    pipe = client.pipeline(transaction=True)
+    for board, key in building.items():
+        if loaded:
+            pipe.rename(key, board_key(board))
+        else:
+            pipe.delete(board_key(board))
+    pipe.execute()
+    return loaded
@@ -0,0 +1,44 @@
+# ===============================
+# gamification/management/commands/bulk_award.py
+# ===============================
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from gamification.models import Achievement
+from gamification.services import BULK_BATCH_SIZE, bulk_award
+
+class Command(BaseCommand):
+    help = 'Award bonus points and/or an achievement to many users at once'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='Users to award (default: every active user)')
+        parser.add_argument('--points', type=int, default=0, help='Bonus points per user')
+        parser.add_argument('--description', default='Bonus', help='Ledger description for the bonus')
+        parser.add_argument('--achievement', type=int, help='Id of the achievement to award')
+        parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE, help='Users per transaction')
+    
+    def handle(self, *args, **options):
+        achievement = None
+        if options['achievement'] is not None:
+            try:
+                achievement = Achievement.objects.get(pk=options['achievement'], is_active=True)
+            except Achievement.DoesNotExist:
+                raise CommandError(f"No active achievement with id {options['achievement']}")
+        if options['points'] < 0:
+            raise CommandError("Bonus points cannot be negative")
+        if not options['points'] and achievement is None:
+            raise CommandError("Give --points, --achievement, or both")
+
+        user_ids = options['user_ids'] or User.objects.filter(is_active=True).values_list('pk', flat=True)
+        report = bulk_award(
+            user_ids, options['points'], options['description'], achievement,
+            batch_size=max(1, options['batch_size'])
+        )
+        for batch in report['batches']:
+            self.stdout.write(
+                f"Batch {batch['batch']}: {batch['users']} users, {batch['achievements_awarded']} achievements, "
+                f"{batch['points_awarded']} points in {batch['seconds']}s"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Awarded {report['points_awarded']} points and {report['achievements_awarded']} achievements "
+            f"to {report['users']} users in {report['seconds']}s"
+        ))
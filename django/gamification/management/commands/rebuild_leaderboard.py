@@ -0,0 +1,18 @@
+# ===============================
+# gamification/management/commands/rebuild_leaderboard.py
+# ===============================
+from django.core.management.base import BaseCommand
+from gamification import leaderboard
+
+class Command(BaseCommand):
+    help = 'Reload the Redis leaderboards from UserProfile points'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=leaderboard.REBUILD_CHUNK_SIZE,
+                            help='Profiles loaded per query')
+    
+    def handle(self, *args, **options):
+        count = leaderboard.rebuild(chunk_size=max(1, options['chunk_size']))
+        self.stdout.write(
+            self.style.SUCCESS(f"Loaded {count} profiles into the {', '.join(leaderboard.BOARDS)} leaderboards")
+        )
@@ -0,0 +1,60 @@
+# ===============================
+# gamification/management/commands/reconcile_points.py
+# ===============================
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from gamification import leaderboard
+from gamification.services import ledger_totals
+from profiles import progression
+from profiles.models import UserProfile
+
+class Command(BaseCommand):
+    help = 'Check UserProfile point balances against the PointTransaction ledger'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Profiles checked per query')
+        parser.add_argument('--fix', action='store_true', help='Set mismatched balances to the ledger totals')
+    
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        checked = mismatched = 0
+        last_pk = 0
+        
+        while True:
+            with transaction.atomic():
+                # Keyset pagination on the primary key, so each chunk is an index range scan
+                profiles = UserProfile.objects.filter(pk__gt=last_pk).order_by('pk')
+                if options['fix']:
+                    # Hold the rows so awards made while the chunk is checked are applied
+                    # on top of the corrected balance instead of being overwritten
+                    profiles = profiles.select_for_update()
+                profiles = list(profiles.only('pk', 'user_id', 'total_points', 'experience_points')[:chunk_size])
+                if not profiles:
+                    break
+                last_pk = profiles[-1].pk
+                
+                totals = ledger_totals([profile.user_id for profile in profiles])
+                wrong = []
+                for profile in profiles:
+                    balance, experience = totals.get(profile.user_id, (0, 0))
+                    if (profile.total_points, profile.experience_points) != (balance, experience):
+                        self.stdout.write(
+                            f"  user {profile.user_id}: profile {profile.total_points}/{profile.experience_points}, "
+                            f"ledger {balance}/{experience} (balance/experience)"
+                        )
+                        profile.total_points = balance
+                        profile.experience_points = experience
+                        wrong.append(profile)
+                
+                if wrong and options['fix']:
+                    UserProfile.objects.bulk_update(wrong, ['total_points', 'experience_points'])
+                    progression.sync_levels(UserProfile.objects.filter(pk__in=[profile.pk for profile in wrong]))
+                    user_ids = [profile.user_id for profile in wrong]
+                    transaction.on_commit(lambda: leaderboard.record_profiles(user_ids))
+            checked += len(profiles)
+            mismatched += len(wrong)
+        
+        summary = f"Checked {checked} profiles, {mismatched} mismatched the ledger"
+        if mismatched and options['fix']:
+            summary += " (corrected)"
+        self.stdout.write(self.style.SUCCESS(summary) if not mismatched or options['fix'] else self.style.WARNING(summary))
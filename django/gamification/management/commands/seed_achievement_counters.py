@@ -0,0 +1,18 @@
+# ===============================
+# gamification/management/commands/seed_achievement_counters.py
+# ===============================
+from django.core.management.base import BaseCommand
+from gamification import rules
+
+class Command(BaseCommand):
+    help = 'Set achievement counters from existing points, quests and cards, and award achievements already reached'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=rules.SEED_CHUNK_SIZE,
+                            help='Counters written per transaction')
+    
+    def handle(self, *args, **options):
+        seeded = rules.seed_counters(chunk_size=max(1, options['chunk_size']))
+        for event_type, (counters, awarded) in seeded.items():
+            self.stdout.write(f"{event_type}: {counters} counters set, {awarded} achievements awarded")
+        self.stdout.write(self.style.SUCCESS("Achievement counters seeded"))
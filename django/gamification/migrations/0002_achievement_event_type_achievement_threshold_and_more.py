@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gamification', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievement',
+            name='event_type',
+            field=models.CharField(blank=True, choices=[('points_earned', 'Points earned'), ('quest_completed', 'Quest completed'), ('card_acquired', 'Card acquired')], db_index=True, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='achievement',
+            name='threshold',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('points_earned', 'Points earned'), ('quest_completed', 'Quest completed'), ('card_acquired', 'Card acquired')], max_length=30)),
+                ('value', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'event_type')},
+            },
+        ),
+    ]
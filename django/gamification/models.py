@@ -5,12 +5,23 @@ from django.contrib.auth.models import User
 from django.db import models
 from model_utils.models import TimeStampedModel
 
+# Events counted per user in UserCounter; achievements unlock on these (see rules.py)
+EVENT_TYPES = [
+    ('points_earned', 'Points earned'),
+    ('quest_completed', 'Quest completed'),
+    ('card_acquired', 'Card acquired'),
+]
+
 class Achievement(TimeStampedModel):
     name = models.CharField(max_length=100)
     description = models.TextField()
     icon = models.ImageField(upload_to='achievements/')
     points_value = models.IntegerField(default=10)
     is_active = models.BooleanField(default=True)
+    # Awarded once the user's counter for event_type reaches threshold;
+    # achievements without an event type are only awarded by hand
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES, blank=True, db_index=True)
+    threshold = models.PositiveIntegerField(default=1)
     
     def __str__(self):
         return self.name
@@ -32,3 +43,13 @@ class PointTransaction(TimeStampedModel):
         ('spend', 'Spent'),
         ('bonus', 'Bonus'),
     ])
+
+
+class UserCounter(models.Model):
+    """Running total of one event type for one user, kept by rules.record_events"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES)
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['user', 'event_type']
@@ -0,0 +1,194 @@
+# ===============================
+# gamification/rules.py
+# ===============================
+# Achievement rules engine. Each active Achievement with an event_type is a
+# rule: "award when the user's counter for event_type reaches threshold".
+# An event only touches its own counters and the rules indexed under its
+# event type, and a rule fires only when an increment carries the counter
+# across its threshold, so the cost of an event doesn't grow with the number
+# of other achievements or users. Counters for activity from before they
+# existed are filled in by `manage.py seed_achievement_counters`.
+from bisect import bisect_right
+from collections import defaultdict
+from cards.models import UserCard
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+from quests.models import QuestProgress
+from .models import Achievement, PointTransaction, UserAchievement, UserCounter
+
+RULES_CACHE_KEY = 'achievement_rules'
+
+# Ledger description of an achievement's payout; those points aren't points_earned
+PAYOUT_PREFIX = 'Achievement: '
+
+# Counters written per transaction by seed_counters
+SEED_CHUNK_SIZE = 1000
+
+def rules_by_event():
+    """
+    event_type -> (thresholds, achievements): both sorted by threshold, where
+    achievements holds (id, name, points_value). Cached until an Achievement
+    changes (signals.py).
+    """
+    rules = cache.get(RULES_CACHE_KEY)
+    if rules is None:
+        grouped = defaultdict(list)
+        achievements = Achievement.objects.filter(is_active=True).exclude(event_type='').order_by('threshold', 'pk')
+        for pk, name, points_value, event_type, threshold in achievements.values_list(
+            'pk', 'name', 'points_value', 'event_type', 'threshold'
+        ):
+            grouped[event_type].append((threshold, (pk, name, points_value)))
+        rules = {
+            event_type: ([threshold for threshold, _ in entries], [achievement for _, achievement in entries])
+            for event_type, entries in grouped.items()
+        }
+        cache.set(RULES_CACHE_KEY, rules, None)
+    return rules
+
+def invalidate_rules():
+    cache.delete(RULES_CACHE_KEY)
+
+def crossed(thresholds, achievements, before, after):
+    """The achievements whose threshold lies in (before, after]"""
+    return achievements[bisect_right(thresholds, before):bisect_right(thresholds, after)]
+
+def record_event(user_id, event_type, amount=1):
+    """Count one event for one user; returns the Achievement ids it unlocked"""
+    return record_events(event_type, {user_id: amount}).get(user_id, [])
+
+def record_events(event_type, amounts):
+    """
+    Count an event for many users at once. amounts is {user_id: amount}.
+    Counters are bumped with one F() UPDATE; each user is then checked only
+    against the rules for event_type. Unlocked achievements are inserted with
+    ignore_conflicts, so unique_together makes a replayed event harmless, and
+    their points are awarded as a bonus. That bonus isn't itself counted as
+    points_earned, so one achievement's reward never unlocks the next.
+    Returns {user_id: [achievement ids]}.
+    """
+    amounts = {user_id: amount for user_id, amount in amounts.items() if amount > 0}
+    if not amounts:
+        return {}
+    rules = rules_by_event().get(event_type)
+
+    with transaction.atomic():
+        UserCounter.objects.bulk_create(
+            [UserCounter(user_id=user_id, event_type=event_type) for user_id in amounts],
+            ignore_conflicts=True
+        )
+        counters = UserCounter.objects.filter(event_type=event_type, user_id__in=amounts)
+        counters.update(value=F('value') + Case(
+            *[When(user_id=user_id, then=Value(amount)) for user_id, amount in amounts.items()],
+            default=Value(0), output_field=IntegerField()
+        ))
+        if rules is None:
+            return {}
+
+        # The UPDATE holds these rows until commit, so value - amount is the value before this event
+        thresholds, achievements = rules
+        unlocked = {}
+        for user_id, value in counters.values_list('user_id', 'value'):
+            reached = crossed(thresholds, achievements, value - amounts[user_id], value)
+            if reached:
+                unlocked[user_id] = reached
+        return _award(unlocked)
+
+def _award(unlocked):
+    """
+    Insert the achievements in unlocked ({user_id: [(id, name, points_value)]})
+    that the users don't hold yet, and pay out their points. Caller holds a transaction.
+    Returns {user_id: [achievement ids awarded]}.
+    """
+    if not unlocked:
+        return {}
+    # Imported here because services.py records points_earned events through this module
+    from .services import award_points_bulk, lock_profiles
+    # Skip achievements already held, e.g. awarded by hand. The profiles
+    # are locked first, as services.bulk_award does, so the two can't both pay out
+    lock_profiles(list(unlocked))
+    held = set(UserAchievement.objects.select_for_update().filter(
+        user_id__in=unlocked, achievement_id__in={pk for reached in unlocked.values() for pk, _, _ in reached}
+    ).values_list('user_id', 'achievement_id'))
+    unlocked = {
+        user_id: [achievement for achievement in reached if (user_id, achievement[0]) not in held]
+        for user_id, reached in unlocked.items()
+    }
+    unlocked = {user_id: reached for user_id, reached in unlocked.items() if reached}
+    if not unlocked:
+        return {}
+
+    UserAchievement.objects.bulk_create(
+        [
+            UserAchievement(user_id=user_id, achievement_id=pk)
+            for user_id, reached in unlocked.items() for pk, _, _ in reached
+        ],
+        ignore_conflicts=True
+    )
+    award_points_bulk(
+        [
+            (user_id, points_value, f"{PAYOUT_PREFIX}{name}")
+            for user_id, reached in unlocked.items() for _, name, points_value in reached
+            if points_value > 0
+        ],
+        transaction_type='bonus', record_events=False
+    )
+    return {user_id: [pk for pk, _, _ in reached] for user_id, reached in unlocked.items()}
+
+def counter_sources():
+    """
+    event_type -> queryset of {'user_id', 'total'}: what each counter should
+    hold, worked out from the records the events are counted from
+    """
+    return {
+        'points_earned': (
+            PointTransaction.objects.filter(transaction_type__in=('earn', 'bonus'))
+            .exclude(description__startswith=PAYOUT_PREFIX)
+            .values('user_id').annotate(total=Sum('points')).order_by()
+        ),
+        'quest_completed': (
+            QuestProgress.objects.filter(status='completed')
+            .values('user_id').annotate(total=Count('pk')).order_by()
+        ),
+        'card_acquired': (
+            UserCard.objects.filter(quantity__gt=0)
+            .values('user_id').annotate(total=Sum('quantity')).order_by()
+        ),
+    }
+
+def seed_counters(chunk_size=SEED_CHUNK_SIZE):
+    """
+    Set every user's counters from existing points, quests and cards, then
+    award the achievements each counter has already reached. For data from
+    before the counters existed: record_events only fires on a crossing, so a
+    user already past a threshold would otherwise never get it. Safe to rerun,
+    as counters are set rather than added to and held achievements are skipped,
+    but events recorded while it runs may be overwritten.
+    Returns {event_type: (counters set, achievements awarded)}.
+    """
+    rules = rules_by_event()
+    seeded = {}
+    for event_type, totals in counter_sources().items():
+        rows = [(row['user_id'], row['total']) for row in totals if row['total'] > 0]
+        awarded = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = dict(rows[start:start + chunk_size])
+            with transaction.atomic():
+                UserCounter.objects.bulk_create(
+                    [UserCounter(user_id=user_id, event_type=event_type) for user_id in chunk],
+                    ignore_conflicts=True
+                )
+                UserCounter.objects.filter(event_type=event_type, user_id__in=chunk).update(value=Case(
+                    *[When(user_id=user_id, then=Value(total)) for user_id, total in chunk.items()],
+                    default=F('value'), output_field=IntegerField()
+                ))
+                if event_type in rules:
+                    thresholds, achievements = rules[event_type]
+                    unlocked = {}
+                    for user_id, total in chunk.items():
+                        reached = crossed(thresholds, achievements, -1, total)
+                        if reached:
+                            unlocked[user_id] = reached
+                    awarded += sum(len(pks) for pks in _award(unlocked).values())
+        seeded[event_type] = (len(rows), awarded)
+    return seeded
@@ -0,0 +1,220 @@
+# ===============================
+# gamification/services.py
+# ===============================
+# Every change to a user's points goes through here, so the PointTransaction
+# ledger and the running balances on UserProfile stay in step: the ledger row
+# and an F() increment of the profile are written in one transaction.
+#
+# Ledger points are signed: earn and bonus rows are positive, spend rows are
+# negative. UserProfile.total_points is the sum of the ledger (the spendable
+# balance); experience_points is the sum of earn and bonus rows only, so
+# spending never costs experience, and level follows experience_points
+# (profiles/progression.py). Earned points count towards achievements
+# (rules.py), except the points an achievement itself pays out, and changed users are copied to the Redis leaderboards
+# (leaderboard.py) once the transaction commits.
+import time
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from profiles import progression
+from profiles.models import UserProfile
+from . import leaderboard, rules
+from .models import PointTransaction, UserAchievement
+
+EXPERIENCE_TYPES = ('earn', 'bonus')
+
+# Ledger rows written per transaction by award_points_bulk
+BULK_BATCH_SIZE = 500
+
+class InsufficientPoints(Exception):
+    pass
+
+def _check_positive(points):
+    if points <= 0:
+        raise ValueError(f"Points must be positive, not {points}")
+
+def _apply_to_profile(user_id, points, experience):
+    """F() increment of one profile, creating the profile if the user has none yet"""
+    changes = {
+        'total_points': F('total_points') + points,
+        'experience_points': F('experience_points') + experience,
+    }
+    profile = UserProfile.objects.filter(user_id=user_id)
+    if not profile.update(**changes):
+        UserProfile.objects.get_or_create(user_id=user_id)
+        profile.update(**changes)
+    if experience:
+        progression.sync_levels(profile)
+
+def lock_profiles(user_ids):
+    """
+    Lock the users' profiles until the transaction ends, creating any that are
+    missing. Rows are locked in primary key order, so two batches sharing users
+    wait for each other instead of deadlocking.
+    """
+    existing = set(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id) for user_id in user_ids if user_id not in existing],
+        ignore_conflicts=True
+    )
+    list(UserProfile.objects.select_for_update().filter(user_id__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+def award_points(user, points, description, transaction_type='earn'):
+    """Earn or bonus points: write the ledger row and add them to the balance and experience"""
+    if transaction_type not in EXPERIENCE_TYPES:
+        raise ValueError(f"award_points cannot record a {transaction_type!r} transaction")
+    _check_positive(points)
+    with transaction.atomic():
+        entry = PointTransaction.objects.create(
+            user=user, points=points, description=description, transaction_type=transaction_type
+        )
+        _apply_to_profile(user.pk, points, points)
+        rules.record_events('points_earned', {user.pk: points})
+        transaction.on_commit(lambda: leaderboard.record_profiles([user.pk]))
+    return entry
+
+def spend_points(user, points, description):
+    """
+    Take points off the user's balance, recording a negative spend row.
+    Raises InsufficientPoints, writing nothing, if the balance is too low.
+    """
+    _check_positive(points)
+    with transaction.atomic():
+        # The balance check and the decrement are one UPDATE, so concurrent spends can't overdraw
+        spent = UserProfile.objects.filter(user=user, total_points__gte=points).update(
+            total_points=F('total_points') - points
+        )
+        if not spent:
+            raise InsufficientPoints(f"{user} has fewer than {points} points")
+        transaction.on_commit(lambda: leaderboard.record_profiles([user.pk]))
+        return PointTransaction.objects.create(
+            user=user, points=-points, description=description, transaction_type='spend'
+        )
+
+def award_points_bulk(awards, transaction_type='earn', batch_size=BULK_BATCH_SIZE, record_events=True):
+    """
+    Award points to many users at once, e.g. a burst of completions or an event bonus.
+    awards is an iterable of (user_id, points, description). Each batch is one
+    transaction: one bulk INSERT into the ledger and one UPDATE of every profile
+    in the batch. Returns the number of ledger rows written.
+    record_events=False leaves the points out of the points_earned counters
+    (used for achievement payouts). Every award is checked before the first batch is written.
+    """
+    if transaction_type not in EXPERIENCE_TYPES:
+        raise ValueError(f"award_points_bulk cannot record a {transaction_type!r} transaction")
+    awards = list(awards)
+    for _, points, _ in awards:
+        _check_positive(points)
+    written = 0
+    batch = []
+    for award in awards:
+        batch.append(award)
+        if len(batch) >= batch_size:
+            written += _write_award_batch(batch, transaction_type, record_events)
+            batch = []
+    if batch:
+        written += _write_award_batch(batch, transaction_type, record_events)
+    return written
+
+@transaction.atomic
+def _write_award_batch(batch, transaction_type, record_events=True):
+    totals = defaultdict(int)
+    for user_id, points, _ in batch:
+        totals[user_id] += points
+
+    PointTransaction.objects.bulk_create([
+        PointTransaction(user_id=user_id, points=points, description=description, transaction_type=transaction_type)
+        for user_id, points, description in batch
+    ])
+
+    # Users without a profile get an empty one first, so the UPDATE reaches them
+    lock_profiles(list(totals))
+
+    delta = Case(
+        *[When(user_id=user_id, then=Value(points)) for user_id, points in totals.items()],
+        default=Value(0), output_field=IntegerField()
+    )
+    profiles = UserProfile.objects.filter(user_id__in=totals)
+    profiles.update(
+        total_points=F('total_points') + delta,
+        experience_points=F('experience_points') + delta,
+    )
+    # Levels in a second UPDATE: within one, MySQL would see the new experience_points and other databases the old
+    progression.sync_levels(profiles)
+    if record_events:
+        rules.record_events('points_earned', totals)
+    user_ids = list(totals)
+    transaction.on_commit(lambda: leaderboard.record_profiles(user_ids))
+    return len(batch)
+
+def bulk_award(user_ids, points=0, description='', achievement=None, batch_size=BULK_BATCH_SIZE):
+    """
+    Award bonus points and/or an Achievement to a set of users, e.g. a whole
+    cohort finishing a unit. Users are handled batch_size at a time, each batch
+    in one transaction: new UserAchievement rows go in with one
+    bulk_create(ignore_conflicts=True), and the achievement's points plus the
+    bonus are written as one ledger INSERT and one profile UPDATE.
+    Unknown user ids are skipped, and users who already hold the achievement
+    don't get its points again. The batch's profiles are locked before the
+    held achievements are read, as rules.py does before an unlock, so a
+    concurrent award of the same achievement can't be paid out twice.
+    Returns dict: {'users', 'achievements_awarded', 'points_awarded', 'seconds', 'batches'}
+    where batches lists {'batch', 'users', 'achievements_awarded', 'points_awarded', 'seconds'}.
+    """
+    if points:
+        _check_positive(points)
+    user_ids = list(dict.fromkeys(user_ids))
+    report = {'users': 0, 'achievements_awarded': 0, 'points_awarded': 0, 'seconds': 0.0, 'batches': []}
+
+    for start in range(0, len(user_ids), batch_size):
+        started = time.perf_counter()
+        with transaction.atomic():
+            chunk = list(User.objects.filter(pk__in=user_ids[start:start + batch_size]).values_list('pk', flat=True))
+            awards = []
+            granted = []
+            if achievement is not None:
+                lock_profiles(chunk)
+                # A locking read, so rows committed since this transaction's snapshot are seen
+                held = set(UserAchievement.objects.select_for_update().filter(achievement=achievement, user_id__in=chunk)
+                           .values_list('user_id', flat=True))
+                granted = [user_id for user_id in chunk if user_id not in held]
+                UserAchievement.objects.bulk_create(
+                    [UserAchievement(user_id=user_id, achievement=achievement) for user_id in granted],
+                    ignore_conflicts=True
+                )
+                if achievement.points_value > 0:
+                    awards += [(user_id, achievement.points_value, f"{rules.PAYOUT_PREFIX}{achievement.name}") for user_id in granted]
+            if points:
+                awards += [(user_id, points, description) for user_id in chunk]
+            if awards:
+                # Only the bonus counts towards points_earned, not the achievement's payout
+                _write_award_batch(awards, 'bonus', record_events=False)
+            if points:
+                rules.record_events('points_earned', {user_id: points for user_id in chunk})
+
+        batch = {
+            'batch': len(report['batches']) + 1,
+            'users': len(chunk),
+            'achievements_awarded': len(granted),
+            'points_awarded': sum(award[1] for award in awards),
+            'seconds': round(time.perf_counter() - started, 4),
+        }
+        report['batches'].append(batch)
+        for key in ('users', 'achievements_awarded', 'points_awarded', 'seconds'):
+            report[key] += batch[key]
+    report['seconds'] = round(report['seconds'], 4)
+    return report
+
+def ledger_totals(user_ids):
+    """user_id -> (balance, experience) summed from the ledger for the given users"""
+    rows = (
+        PointTransaction.objects.filter(user_id__in=user_ids)
+        .values('user_id')
+        .annotate(
+            balance=Sum('points'),
+            experience=Sum('points', filter=Q(transaction_type__in=EXPERIENCE_TYPES)),
+        )
+        .order_by()
+    )
+    return {row['user_id']: (row['balance'] or 0, row['experience'] or 0) for row in rows}
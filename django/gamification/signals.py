@@ -0,0 +1,35 @@
+# ===============================
+# gamification/signals.py
+# ===============================
+from cards.models import UserCard
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from profiles.models import UserProfile
+from quests.models import QuestProgress
+from . import leaderboard, rules
+from .models import Achievement
+
+@receiver(post_delete, sender=UserProfile)
+def remove_from_leaderboards(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: leaderboard.remove_users([user_id]))
+
+@receiver([post_save, post_delete], sender=Achievement)
+def achievement_changed(sender, **kwargs):
+    rules.invalidate_rules()
+
+@receiver(post_save, sender=QuestProgress)
+def quest_progress_saved(sender, instance, created, **kwargs):
+    """Count a quest completion when the status first becomes completed"""
+    if instance.status != 'completed':
+        return
+    if created or instance.tracker.previous('status') != 'completed':
+        rules.record_event(instance.user_id, 'quest_completed')
+
+@receiver(post_save, sender=UserCard)
+def user_card_saved(sender, instance, created, **kwargs):
+    """Count cards gained: the whole quantity for a new card, the increase for one already held"""
+    gained = instance.quantity if created else instance.quantity - (instance.tracker.previous('quantity') or 0)
+    if gained > 0:
+        rules.record_event(instance.user_id, 'card_acquired', gained)
@@ -1,3 +1,229 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from profiles.models import UserProfile
+from quests.models import Quest, QuestProgress
+from . import rules
+from .models import Achievement, PointTransaction, UserAchievement, UserCounter
+from .services import (
+    InsufficientPoints, award_points, award_points_bulk, bulk_award, ledger_totals, spend_points
+)
 
-# Create your tests here.
+def make_achievement(name, points_value=10, event_type='', threshold=1):
+    return Achievement.objects.create(
+        name=name, description='', icon='achievements/test.png',
+        points_value=points_value, event_type=event_type, threshold=threshold
+    )
+
+def profile(user):
+    return UserProfile.objects.get(user=user)
+
+class GamificationTestCase(TestCase):
+    def setUp(self):
+        # The rules cache outlives each test's rolled-back transaction
+        rules.invalidate_rules()
+        self.addCleanup(rules.invalidate_rules)
+
+class PointsServiceTests(GamificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='learner')
+
+    def test_award_then_spend(self):
+        award_points(self.user, 40, 'Quest')
+        spend_points(self.user, 15, 'Card pack')
+        self.assertEqual((profile(self.user).total_points, profile(self.user).experience_points), (25, 40))
+        self.assertEqual(ledger_totals([self.user.pk]), {self.user.pk: (25, 40)})
+        self.assertEqual(
+            list(PointTransaction.objects.order_by('pk').values_list('points', 'transaction_type')),
+            [(40, 'earn'), (-15, 'spend')]
+        )
+
+    def test_spend_more_than_balance_writes_nothing(self):
+        award_points(self.user, 10, 'Quest')
+        with self.assertRaises(InsufficientPoints):
+            spend_points(self.user, 11, 'Card pack')
+        self.assertEqual(profile(self.user).total_points, 10)
+        self.assertEqual(PointTransaction.objects.count(), 1)
+
+    def test_non_positive_points_rejected(self):
+        award_points(self.user, 15, 'Quest')
+        for call in (
+            lambda: spend_points(self.user, -50, 'Refund?'),
+            lambda: award_points(self.user, -20, 'Penalty?'),
+            lambda: award_points(self.user, 0, 'Nothing'),
+            lambda: award_points_bulk([(self.user.pk, 5, 'Fine'), (self.user.pk, -5, 'Bad')]),
+        ):
+            with self.assertRaises(ValueError):
+                call()
+        self.assertEqual((profile(self.user).total_points, profile(self.user).experience_points), (15, 15))
+        self.assertEqual(PointTransaction.objects.count(), 1)
+
+    def test_bulk_awards_sum_per_user(self):
+        other = User.objects.create(username='other')
+        UserProfile.objects.create(user=other, total_points=7, experience_points=7)
+        written = award_points_bulk(
+            [(self.user.pk, 5, 'a'), (other.pk, 3, 'b'), (self.user.pk, 4, 'c')], batch_size=2
+        )
+        self.assertEqual(written, 3)
+        # self.user had no profile; one is created for the award
+        self.assertEqual(profile(self.user).total_points, 9)
+        self.assertEqual(profile(other).total_points, 10)
+        self.assertEqual(ledger_totals([self.user.pk, other.pk]), {self.user.pk: (9, 9), other.pk: (3, 3)})
+
+class RulesTests(GamificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='learner')
+        self.ten = make_achievement('Ten points', points_value=10, event_type='points_earned', threshold=10)
+        self.fifteen = make_achievement('Fifteen points', points_value=10, event_type='points_earned', threshold=15)
+
+    def held(self):
+        return set(UserAchievement.objects.filter(user=self.user).values_list('achievement_id', flat=True))
+
+    def test_crossed(self):
+        thresholds, achievements = [1, 5, 10], ['a', 'b', 'c']
+        self.assertEqual(rules.crossed(thresholds, achievements, 0, 1), ['a'])
+        self.assertEqual(rules.crossed(thresholds, achievements, 1, 4), [])
+        self.assertEqual(rules.crossed(thresholds, achievements, 4, 10), ['b', 'c'])
+        self.assertEqual(rules.crossed(thresholds, achievements, 10, 50), [])
+
+    def test_unlock_on_crossing_threshold(self):
+        award_points(self.user, 6, 'Quest')
+        self.assertEqual(self.held(), set())
+        award_points(self.user, 6, 'Quest')
+        self.assertEqual(self.held(), {self.ten.pk})
+        # 12 earned plus the 10 point payout, which doesn't count towards the next threshold
+        self.assertEqual(profile(self.user).total_points, 22)
+        self.assertEqual(UserCounter.objects.get(user=self.user, event_type='points_earned').value, 12)
+
+    def test_payout_does_not_cascade(self):
+        award_points(self.user, 10, 'Quest')
+        self.assertEqual(self.held(), {self.ten.pk})
+
+    def test_one_event_crosses_two_thresholds(self):
+        award_points(self.user, 20, 'Quest')
+        self.assertEqual(self.held(), {self.ten.pk, self.fifteen.pk})
+        self.assertEqual(profile(self.user).total_points, 40)
+
+    def test_already_held_not_paid_again(self):
+        UserAchievement.objects.create(user=self.user, achievement=self.ten)
+        award_points(self.user, 10, 'Quest')
+        self.assertEqual(profile(self.user).total_points, 10)
+        self.assertEqual(UserAchievement.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_events(self):
+        other = User.objects.create(username='other')
+        unlocked = rules.record_events('points_earned', {self.user.pk: 16, other.pk: 9})
+        self.assertEqual(unlocked, {self.user.pk: [self.ten.pk, self.fifteen.pk]})
+        unlocked = rules.record_events('points_earned', {self.user.pk: 100, other.pk: 1})
+        self.assertEqual(unlocked, {other.pk: [self.ten.pk]})
+
+    def test_rules_follow_achievement_changes(self):
+        award_points(self.user, 5, 'Quest')
+        make_achievement('Five points', event_type='points_earned', threshold=5)
+        self.ten.is_active = False
+        self.ten.save()
+        # 5 -> 10 crosses neither the new threshold (already passed) nor the deactivated one
+        award_points(self.user, 5, 'Quest')
+        self.assertEqual(self.held(), set())
+        award_points(self.user, 5, 'Quest')
+        self.assertEqual(
+            set(UserAchievement.objects.filter(user=self.user).values_list('achievement__name', flat=True)),
+            {'Fifteen points'}
+        )
+
+    def test_quest_completion_counted_once(self):
+        first_quest = make_achievement('First quest', points_value=0, event_type='quest_completed', threshold=1)
+        quest = Quest.objects.create(title='Q', description='', story_prompt='', difficulty=1)
+        progress = QuestProgress.objects.create(user=self.user, quest=quest, status='in_progress')
+        progress.status = 'completed'
+        progress.save()
+        progress.save()
+        self.assertEqual(UserCounter.objects.get(user=self.user, event_type='quest_completed').value, 1)
+        self.assertEqual(self.held(), {first_quest.pk})
+
+class SeedCountersTests(GamificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='learner')
+        # History from before the counters existed
+        PointTransaction.objects.bulk_create([
+            PointTransaction(user=self.user, points=30, description='Quest', transaction_type='earn'),
+            PointTransaction(user=self.user, points=5, description='Event', transaction_type='bonus'),
+            PointTransaction(user=self.user, points=50, description='Achievement: Old', transaction_type='bonus'),
+            PointTransaction(user=self.user, points=-10, description='Shop', transaction_type='spend'),
+        ])
+        UserProfile.objects.create(user=self.user, total_points=75, experience_points=85)
+        quest = Quest.objects.create(title='Q', description='', story_prompt='', difficulty=1)
+        QuestProgress.objects.bulk_create([QuestProgress(user=self.user, quest=quest, status='completed')])
+
+    def counter(self, event_type):
+        return UserCounter.objects.get(user=self.user, event_type=event_type).value
+
+    def test_counters_seeded_and_reached_achievements_awarded(self):
+        thirty = make_achievement('Thirty points', points_value=10, event_type='points_earned', threshold=30)
+        make_achievement('Fifty points', event_type='points_earned', threshold=50)
+        first_quest = make_achievement('First quest', points_value=0, event_type='quest_completed', threshold=1)
+
+        seeded = rules.seed_counters()
+        # Earn and bonus rows count, spends and achievement payouts don't
+        self.assertEqual(self.counter('points_earned'), 35)
+        self.assertEqual(self.counter('quest_completed'), 1)
+        self.assertEqual(seeded['points_earned'], (1, 1))
+        self.assertEqual(
+            set(UserAchievement.objects.filter(user=self.user).values_list('achievement_id', flat=True)),
+            {thirty.pk, first_quest.pk}
+        )
+        self.assertEqual(profile(self.user).total_points, 85)
+
+        # Rerunning sets the same values and pays nothing twice
+        rules.seed_counters()
+        self.assertEqual(self.counter('points_earned'), 35)
+        self.assertEqual(profile(self.user).total_points, 85)
+
+        # Later events continue from the seeded value
+        award_points(self.user, 15, 'Quest')
+        self.assertIn('Fifty points', UserAchievement.objects.filter(user=self.user).values_list('achievement__name', flat=True))
+
+class BulkAwardTests(GamificationTestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.bulk_create([User(username=f'learner{i}') for i in range(25)])
+        self.user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        self.cohort = make_achievement('Cohort', points_value=20)
+
+    def test_award_achievement_and_bonus(self):
+        UserAchievement.objects.create(user_id=self.user_ids[0], achievement=self.cohort)
+        report = bulk_award(self.user_ids + [max(self.user_ids) + 1000], 5, 'Cohort bonus', self.cohort, batch_size=10)
+
+        self.assertEqual(report['users'], 25)
+        self.assertEqual(report['achievements_awarded'], 24)
+        self.assertEqual(report['points_awarded'], 24 * 20 + 25 * 5)
+        self.assertEqual([batch['users'] for batch in report['batches']], [10, 10, 5])
+        self.assertTrue(all(batch['seconds'] >= 0 for batch in report['batches']))
+
+        self.assertEqual(UserAchievement.objects.filter(achievement=self.cohort).count(), 25)
+        self.assertEqual(UserProfile.objects.get(user_id=self.user_ids[0]).total_points, 5)
+        self.assertEqual(UserProfile.objects.get(user_id=self.user_ids[1]).total_points, 25)
+        self.assertEqual(
+            ledger_totals(self.user_ids),
+            {p.user_id: (p.total_points, p.experience_points) for p in UserProfile.objects.all()}
+        )
+
+    def test_repeat_award_pays_once(self):
+        bulk_award(self.user_ids, achievement=self.cohort)
+        report = bulk_award(self.user_ids, achievement=self.cohort)
+        self.assertEqual((report['achievements_awarded'], report['points_awarded']), (0, 0))
+        self.assertEqual(set(UserProfile.objects.values_list('total_points', flat=True)), {20})
+
+    def test_bonus_counts_towards_rules_but_payout_does_not(self):
+        make_achievement('Twenty points', points_value=10, event_type='points_earned', threshold=20)
+        bulk_award(self.user_ids[:3], 10, 'Bonus', self.cohort)
+        self.assertEqual(UserAchievement.objects.filter(achievement__name='Twenty points').count(), 0)
+        bulk_award(self.user_ids[:3], 10, 'Bonus')
+        self.assertEqual(UserAchievement.objects.filter(achievement__name='Twenty points').count(), 3)
+
+    def test_negative_bonus_rejected(self):
+        with self.assertRaises(ValueError):
+            bulk_award(self.user_ids, -5, 'Penalty')
+        self.assertFalse(PointTransaction.objects.exists())
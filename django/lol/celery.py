@@ -0,0 +1,12 @@
+# ===============================
+# lol/celery.py
+# ===============================
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lol.settings')
+
+app = Celery('lol')
+# All Celery options live in settings.py with a CELERY_ prefix
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -138,4 +138,30 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
         'LOCATION': 'redis://redis:6379/1',
     }
-}
\ No newline at end of file
+}
+# Celery (training package sync and import tasks, see training_data/tasks.py)
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
+# Run tasks inline in the calling process, for tests and for working without a worker.
+# Errors are kept in the returned result (raised by .get()) rather than propagated,
+# since propagating would also raise the Retry of a task that is retrying.
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "False") == "True"
+# Acknowledge after the task finishes and take one task at a time, so a slow
+# package holds up only its own worker process and a lost worker's task is redelivered
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+# Tasks that write the scripts' shared files run on one single-process worker
+CELERY_TASK_ROUTES = {
+    'training_data.tasks.sync_training_packages': {'queue': 'tga_sync'},
+    'training_data.tasks.process_training_packages': {'queue': 'tga_sync'},
+    'training_data.tasks.finish_processing': {'queue': 'tga_sync'},
+    'training_data.tasks.update_and_process': {'queue': 'tga_sync'},
+}
+
+# Redis holding the leaderboard sorted sets (gamification/leaderboard.py).
+# Empty means the cache's Redis above; note that cache.clear() flushes that
+# database, after which `manage.py rebuild_leaderboard` restores the boards.
+LEADERBOARD_REDIS_URL = os.getenv("LEADERBOARD_REDIS_URL", "")
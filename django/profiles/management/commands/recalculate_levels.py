@@ -0,0 +1,39 @@
+# ===============================
+# profiles/management/commands/recalculate_levels.py
+# ===============================
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from profiles import progression
+from profiles.models import UserProfile
+
+class Command(BaseCommand):
+    help = 'Recompute every UserProfile level from its experience points'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Profiles updated per statement')
+    
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        checked = changed = 0
+        last_pk = 0
+        
+        while True:
+            # Keyset pagination on the primary key: find where this chunk ends,
+            # then update the whole range with one set-based UPDATE
+            pks = list(
+                UserProfile.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not pks:
+                break
+            chunk = UserProfile.objects.filter(pk__gt=last_pk, pk__lte=pks[-1])
+            # Only rows whose level is wrong are written
+            changed += progression.sync_levels(
+                chunk.alias(expected=progression.level_expression()).exclude(level=F('expected'))
+            )
+            checked += len(pks)
+            last_pk = pks[-1]
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} profiles, updated {changed} levels "
+            f"({progression.MAX_LEVEL} levels, top threshold {progression.LEVEL_THRESHOLDS[-1]} XP)"
+        ))
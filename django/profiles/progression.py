@@ -0,0 +1,55 @@
+# ===============================
+# profiles/progression.py
+# ===============================
+# The XP curve. LEVEL_THRESHOLDS is precomputed once: entry i is the
+# experience needed to reach level i + 1, so a user's level is a binary search
+# of the table rather than a walk up the curve. After changing the curve, run
+# `manage.py recalculate_levels` to bring stored levels in line.
+from bisect import bisect_right
+from django.db.models import Case, IntegerField, Value, When
+
+# Experience needed for level n is BASE_XP * (n - 1) ** EXPONENT
+BASE_XP = 100
+EXPONENT = 1.5
+MAX_LEVEL = 100
+
+LEVEL_THRESHOLDS = tuple(int(round(BASE_XP * (level - 1) ** EXPONENT)) for level in range(1, MAX_LEVEL + 1))
+
+def level_for(experience):
+    """The level reached with the given experience points"""
+    return max(1, bisect_right(LEVEL_THRESHOLDS, experience))
+
+def threshold_for(level):
+    """Experience needed to reach level; levels past MAX_LEVEL can't be reached"""
+    if level > MAX_LEVEL:
+        return None
+    return LEVEL_THRESHOLDS[max(1, level) - 1]
+
+def progress(experience):
+    """Dict: {'level', 'experience', 'level_start', 'next_level_at'} (next_level_at is None at MAX_LEVEL)"""
+    level = level_for(experience)
+    return {
+        'level': level,
+        'experience': experience,
+        'level_start': threshold_for(level),
+        'next_level_at': threshold_for(level + 1),
+    }
+
+def level_expression():
+    """
+    SQL equivalent of level_for(experience_points): one WHEN per threshold
+    range, highest first, so a single UPDATE sets the level of every row it
+    touches whatever their experience.
+    """
+    return Case(
+        *[
+            When(experience_points__gte=threshold, then=Value(index + 1))
+            for index, threshold in reversed(list(enumerate(LEVEL_THRESHOLDS)))
+            if index
+        ],
+        default=Value(1), output_field=IntegerField()
+    )
+
+def sync_levels(profiles):
+    """Set level from experience_points for every profile in a UserProfile queryset; returns rows updated"""
+    return profiles.update(level=level_expression())
@@ -3,6 +3,7 @@
 # ===============================
 from django.contrib.auth.models import User
 from django.db import models
+from model_utils import FieldTracker
 from model_utils.models import TimeStampedModel
 
 class Quest(TimeStampedModel):
@@ -34,5 +35,8 @@ class QuestProgress(TimeStampedModel):
     progress_data = models.JSONField(default=dict)  # Store quest-specific progress
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    # Lets gamification count a completion once, when the status changes
+    tracker = FieldTracker(fields=['status'])
+    
     class Meta:
         unique_together = ['user', 'quest']
\ No newline at end of file
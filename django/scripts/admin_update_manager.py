@@ -4,22 +4,41 @@ Admin Update Manager for Training Package Data
 Orchestrates the update process for training packages, qualifications, units, etc.
 """
 
-import os
 import sys
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import mysql.connector
 from mysql.connector import errorcode
+from db_pool import get_connection, prepared_cursor
+from tga_importer import import_training_packages, rebuild_search_index
+from sync_journal import SyncJournal
+from sync_metrics import metrics
+from tga_pipeline import PackagePipeline
 
-# Import your existing update scripts
-from update_tps import get_current_training_packages, upsert_training_packages_to_db
+# Processing stages in run order: (journal stage, update_settings flag, heading)
+PROCESS_STAGES = [
+    ('qualifications', 'process_qualifications', 'Qualifications'),
+    ('units', 'process_units', 'Units'),
+    ('elements', 'process_elements', 'Elements and Performance Criteria'),
+    ('required_skills', 'process_required_skills', 'Required Skills'),
+]
+
+# Importer record types written by each stage
+STAGE_RECORD_TYPES = {
+    'qualifications': ('qualification', 'qual_unit'),
+    'units': ('unit',),
+    'elements': ('element', 'pc'),
+    'required_skills': ('required_skill',),
+}
 
 class UpdateManager:
     def __init__(self):
         load_dotenv()
         self.config_file = 'update_config.json'
         self.load_config()
+        # Per-package stage completion, kept beside update_config.json
+        self.journal = SyncJournal('sync_journal.json')
         
     def load_config(self):
         """Load configuration from JSON file"""
@@ -31,9 +50,25 @@ class UpdateManager:
                 "process_units": True,
                 "process_elements": True,
                 "process_required_skills": True,
-                "batch_size": 50
+                "batch_size": 50,
+                "max_download_workers": 8,
+                "async_metadata": False,
+                "metadata_concurrency": 20,
+                "metadata_rate_limit": 10,
+                "metadata_timeout": 30,
+                "incremental_sync": True,
+                "sync_overlap_minutes": 60,
+                "search_page_size": 500,
+                "use_pipeline": True,
+                "pipeline_download_workers": 4,
+                "pipeline_parse_workers": 0,
+                "pipeline_load_workers": 2,
+                "pipeline_queue_size": 8,
+                "metrics_json": "sync_metrics.json",
+                "metrics_prometheus": "sync_metrics.prom"
             },
-            "last_full_update": None
+            "last_full_update": None,
+            "last_tps_sync": None
         }
         
         try:
@@ -49,52 +84,118 @@ class UpdateManager:
             json.dump(self.config, f, indent=2, default=str)
     
     def get_db_connection(self):
-        """Get database connection using environment variables"""
-        return mysql.connector.connect(
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            host=os.getenv('DB_HOST', '127.0.0.1'),
-            database=os.getenv('DB_NAME'),
-            port=int(os.getenv('DB_PORT', '3306'))
-        )
+        """Borrow a connection from the shared pool (db_pool.py); close() returns it"""
+        return get_connection()
     
     def get_available_training_packages(self):
         """Get list of available training packages from database"""
         try:
             cnx = self.get_db_connection()
-            cursor = cnx.cursor()
-            
-            query = "SELECT tpCode, tpTitle, ReleaseDate, processed FROM lol_tps ORDER BY tpCode"
-            cursor.execute(query)
-            
-            packages = []
-            for (code, title, release_date, processed) in cursor:
-                packages.append({
-                    'code': code,
-                    'title': title,
-                    'release_date': release_date,
-                    'processed': processed
-                })
-            
-            cursor.close()
-            cnx.close()
-            return packages
+            try:
+                cursor = cnx.cursor()
+                
+                query = "SELECT tpCode, tpTitle, ReleaseDate, processed FROM lol_tps ORDER BY tpCode"
+                cursor.execute(query)
+                
+                packages = []
+                for (code, title, release_date, processed) in cursor:
+                    packages.append({
+                        'code': code,
+                        'title': title,
+                        'release_date': release_date,
+                        'processed': processed
+                    })
+                
+                cursor.close()
+                return packages
+            finally:
+                cnx.close()
             
         except mysql.connector.Error as err:
             print(f"Database error: {err}")
             return []
     
-    def update_training_packages(self):
-        """Step 1: Update training packages list"""
+    def update_training_packages(self, full=False):
+        """
+        Step 1: Update training packages list
+        Asks TGA only for packages modified since the last successful sync
+        (last_tps_sync) unless full is True, incremental_sync is off or no sync
+        has completed yet. Per-phase metrics are reported at the end, whether
+        or not the sync succeeded.
+        """
+        metrics.reset()
+        try:
+            return self.sync_training_packages(full)
+        finally:
+            self.report_sync_metrics()
+    
+    def report_sync_metrics(self):
+        """Print the sync metrics as JSON and write the metrics_json and metrics_prometheus files"""
+        settings = self.config.get('update_settings', {})
+        print("\n=== Sync Metrics ===")
+        print(json.dumps(metrics.summary(), indent=2))
+        try:
+            # An empty path turns that output off
+            json_path = settings.get('metrics_json', 'sync_metrics.json')
+            if json_path:
+                metrics.write_json(json_path)
+            prometheus_path = settings.get('metrics_prometheus', 'sync_metrics.prom')
+            if prometheus_path:
+                metrics.write_prometheus(prometheus_path)
+        except OSError as e:
+            print(f"Warning: Could not write sync metrics: {e}")
+    
+    def sync_training_packages(self, full=False):
+        """Search TGA and upsert the results into lol_tps; returns True on success"""
         print("=== Updating Training Package List ===")
-        training_packages = get_current_training_packages()
-        if training_packages:
-            upsert_training_packages_to_db(training_packages, debug=False)
-            print("Training packages updated successfully")
-            return True
+        # Imported here so commands that never talk to TGA start without loading zeep
+        from update_tps import (
+            get_current_training_packages, get_modified_training_packages, upsert_training_packages_to_db
+        )
+        
+        settings = self.config.get('update_settings', {})
+        metadata_options = None
+        if settings.get('async_metadata', False):
+            metadata_options = {
+                'concurrency': settings.get('metadata_concurrency', 20),
+                'rate_limit': settings.get('metadata_rate_limit', 10),
+                'timeout': settings.get('metadata_timeout', 30)
+            }
+        
+        # Taken before the search so changes made during the run are picked up next time
+        sync_started = datetime.now()
+        last_sync = self.config.get('last_tps_sync')
+        
+        if full or not last_sync or not settings.get('incremental_sync', True):
+            print("Requesting full training package list")
+            training_packages = get_current_training_packages(settings.get('search_page_size'))
         else:
-            print("Failed to retrieve training packages")
+            # Overlap the previous window a little to allow for clock differences
+            overlap = timedelta(minutes=settings.get('sync_overlap_minutes', 60))
+            since = datetime.fromisoformat(last_sync) - overlap
+            print(f"Requesting training packages modified since {since.isoformat(timespec='seconds')}")
+            training_packages = get_modified_training_packages(
+                since, sync_started, page_size=settings.get('search_page_size')
+            )
+        
+        # Search pages are requested as the upsert consumes them, so a failed
+        # search shows up as a failed upsert
+        committed = upsert_training_packages_to_db(
+            training_packages,
+            debug=False,
+            max_workers=settings.get('max_download_workers', 8),
+            batch_size=settings.get('batch_size', 50),
+            metadata_options=metadata_options
+        )
+        if not committed:
+            print("Training package update failed, sync high-water mark not advanced")
             return False
+        
+        # Only advance the high-water mark after a successful commit
+        self.config['last_tps_sync'] = sync_started.isoformat()
+        self.save_config()
+        print("Training packages updated successfully")
+        return True
     
     def select_training_packages_interactive(self):
         """Interactive training package selection"""
@@ -142,36 +243,56 @@ class UpdateManager:
             if pkg:
                 print(f"  - {code}: {pkg['title'][:50]}...")
     
-    def process_selected_packages(self):
-        """Process the selected training packages"""
+    def process_selected_packages(self, restart=False):
+        """
+        Process the selected training packages
+        Each package's stages are recorded in the job journal as they are
+        committed, so rerunning after a crash resumes instead of starting over
+        (unless restart is True).
+        """
         selected = self.config.get('selected_training_packages', [])
         if not selected:
             print("No training packages selected. Use select_packages first.")
             return
         
         settings = self.config.get('update_settings', {})
+        stages = [stage for stage in PROCESS_STAGES if settings.get(stage[1], True)]
+        stage_names = [stage for stage, _, _ in stages]
         
         print(f"\n=== Processing {len(selected)} Training Packages ===")
         
-        # Process qualifications
-        if settings.get('process_qualifications', True):
-            print("\n--- Processing Qualifications ---")
-            self.process_qualifications(selected)
+        if self.journal.start('process', selected, stage_names, restart):
+            done, total = self.journal.progress('process')
+            print(f"Resuming previous run: {done} of {total} package stages already complete")
         
-        # Process units
-        if settings.get('process_units', True):
-            print("\n--- Processing Units ---")
-            self.process_units(selected)
+        if settings.get('use_pipeline', True):
+            self.run_pipeline(selected, stage_names)
+        else:
+            stage_methods = {
+                'qualifications': self.process_qualifications,
+                'units': self.process_units,
+                'elements': self.process_elements_and_pcs,
+                'required_skills': self.process_required_skills,
+            }
+            for stage, _, heading in stages:
+                print(f"\n--- Processing {heading} ---")
+                pending = self.journal.pending('process', selected, stage)
+                if not pending:
+                    print("Already complete for all selected packages")
+                    continue
+                stage_methods[stage](pending)
         
-        # Process elements and performance criteria
-        if settings.get('process_elements', True):
-            print("\n--- Processing Elements and Performance Criteria ---")
-            self.process_elements_and_pcs(selected)
+        completed = [
+            code for code in selected
+            if all(self.journal.is_done('process', code, stage) for stage in stage_names)
+        ]
+        self.mark_packages_processed(completed)
         
-        # Process required skills
-        if settings.get('process_required_skills', True):
-            print("\n--- Processing Required Skills ---")
-            self.process_required_skills(selected)
+        if len(completed) < len(selected):
+            print(f"\n{len(selected) - len(completed)} packages did not finish. Run process again to resume.")
+            return
+        
+        self.journal.finish('process')
         
         # Update last run timestamp
         self.config['last_full_update'] = datetime.now().isoformat()
@@ -179,25 +300,113 @@ class UpdateManager:
         
         print("\n=== Processing Complete ===")
     
+    def run_pipeline(self, tp_codes, stage_names):
+        """
+        Run all enabled stages for each package in one pass through the
+        download -> parse -> load pipeline
+        """
+        settings = self.config.get('update_settings', {})
+        pending = [
+            code for code in tp_codes
+            if not all(self.journal.is_done('process', code, stage) for stage in stage_names)
+        ]
+        if not pending:
+            print("Already complete for all selected packages")
+            return
+        
+        record_types = [t for stage in stage_names for t in STAGE_RECORD_TYPES[stage]]
+        print(f"\n--- Running pipeline for {len(pending)} packages ({', '.join(stage_names)}) ---")
+        
+        def on_loaded(tp_code, counts):
+            for stage in stage_names:
+                self.journal.mark_done('process', [tp_code], stage)
+        
+        pipeline = PackagePipeline(
+            self.get_db_connection,
+            record_types=record_types,
+            download_workers=settings.get('pipeline_download_workers', 4),
+            parse_workers=settings.get('pipeline_parse_workers', 0) or None,
+            load_workers=settings.get('pipeline_load_workers', 2),
+            queue_size=settings.get('pipeline_queue_size', 8),
+            batch_size=settings.get('batch_size', 50),
+            download_missing=settings.get('download_xml', True),
+            on_loaded=on_loaded
+        )
+        return pipeline.run(pending)
+    
+    def import_records(self, tp_codes, record_types, stage=None):
+        """
+        Stream the downloaded XML of each package into the lol_* tables
+        If stage is given, each committed package is recorded in the job journal.
+        """
+        settings = self.config.get('update_settings', {})
+        
+        on_committed = None
+        if stage:
+            def on_committed(tp_code, counts):
+                self.journal.mark_done('process', [tp_code], stage)
+        
+        try:
+            cnx = self.get_db_connection()
+            try:
+                return import_training_packages(
+                    cnx, tp_codes, record_types,
+                    batch_size=settings.get('batch_size', 50),
+                    on_committed=on_committed
+                )
+            finally:
+                cnx.close()
+        except mysql.connector.Error as err:
+            print(f"Database error: {err}")
+            return None
+    
     def process_qualifications(self, tp_codes):
-        """Placeholder for qualification processing"""
-        print("Qualification processing not yet implemented")
-        print(f"Would process qualifications for: {', '.join(tp_codes)}")
+        """Import qualifications from the downloaded XML"""
+        self.import_records(tp_codes, STAGE_RECORD_TYPES['qualifications'], 'qualifications')
     
     def process_units(self, tp_codes):
-        """Placeholder for unit processing"""
-        print("Unit processing not yet implemented")
-        print(f"Would process units for: {', '.join(tp_codes)}")
+        """Import units of competency from the downloaded XML"""
+        self.import_records(tp_codes, STAGE_RECORD_TYPES['units'], 'units')
     
     def process_elements_and_pcs(self, tp_codes):
-        """Placeholder for elements and performance criteria processing"""
-        print("Elements/PC processing not yet implemented")
-        print(f"Would process elements/PCs for: {', '.join(tp_codes)}")
+        """Import elements and performance criteria from the downloaded XML"""
+        self.import_records(tp_codes, STAGE_RECORD_TYPES['elements'], 'elements')
     
     def process_required_skills(self, tp_codes):
-        """Placeholder for required skills processing"""
-        print("Required skills processing not yet implemented")
-        print(f"Would process required skills for: {', '.join(tp_codes)}")
+        """Import required skills and knowledge from the downloaded XML"""
+        self.import_records(tp_codes, STAGE_RECORD_TYPES['required_skills'], 'required_skills')
+    
+    def rebuild_search_index(self, tp_codes=None):
+        """Rebuild the lol_search full-text index, for every package in lol_tps if none are given"""
+        if not tp_codes:
+            tp_codes = [p['code'] for p in self.get_available_training_packages()]
+        print(f"\n--- Rebuilding search index for {len(tp_codes)} packages ---")
+        try:
+            cnx = self.get_db_connection()
+            try:
+                rebuild_search_index(cnx, tp_codes)
+            finally:
+                cnx.close()
+        except mysql.connector.Error as err:
+            print(f"Database error: {err}")
+    
+    def mark_packages_processed(self, tp_codes):
+        """Set processed = 'Y' in lol_tps for the given packages"""
+        if not tp_codes:
+            return
+        try:
+            cnx = self.get_db_connection()
+            try:
+                # One prepared statement, executed per package
+                cursor = prepared_cursor(cnx)
+                cursor.executemany("UPDATE lol_tps SET processed = 'Y' WHERE tpCode = %s",
+                                   [(code,) for code in tp_codes])
+                cnx.commit()
+                cursor.close()
+            finally:
+                cnx.close()
+        except mysql.connector.Error as err:
+            print(f"Database error: {err}")
     
     def show_status(self):
         """Show current status of training packages"""
@@ -219,6 +428,14 @@ class UpdateManager:
         last_update = self.config.get('last_full_update')
         if last_update:
             print(f"Last full update: {last_update}")
+        
+        last_sync = self.config.get('last_tps_sync')
+        if last_sync:
+            print(f"Last training package sync: {last_sync}")
+        
+        done, total = self.journal.progress('process')
+        if total:
+            print(f"Unfinished processing run: {done} of {total} package stages complete")
     
     def interactive_menu(self):
         """Interactive menu for administrators"""
@@ -260,9 +477,10 @@ class UpdateManager:
         print(f"3. Process elements: {settings.get('process_elements', True)}")
         print(f"4. Process required skills: {settings.get('process_required_skills', True)}")
         print(f"5. Batch size: {settings.get('batch_size', 50)}")
-        print("6. Back to main menu")
+        print(f"6. Parallel XML downloads: {settings.get('max_download_workers', 8)}")
+        print("7. Back to main menu")
         
-        choice = input("\nChange setting (1-6): ").strip()
+        choice = input("\nChange setting (1-7): ").strip()
         
         if choice in ['1', '2', '3', '4']:
             setting_map = {
@@ -286,6 +504,17 @@ class UpdateManager:
                 print(f"Batch size changed to {new_size}")
             except ValueError:
                 print("Invalid batch size")
+        elif choice == '6':
+            try:
+                new_workers = int(input("Enter number of parallel downloads: "))
+                if new_workers < 1:
+                    raise ValueError
+                settings['max_download_workers'] = new_workers
+                self.config['update_settings'] = settings
+                self.save_config()
+                print(f"Parallel XML downloads changed to {new_workers}")
+            except ValueError:
+                print("Invalid number of parallel downloads")
 
 def main():
     if len(sys.argv) > 1:
@@ -293,19 +522,21 @@ def main():
         manager = UpdateManager()
         
         if sys.argv[1] == 'update_tps':
-            manager.update_training_packages()
+            manager.update_training_packages(full='--full' in sys.argv[2:])
         elif sys.argv[1] == 'process':
-            if len(sys.argv) > 2:
+            args = [arg for arg in sys.argv[2:] if not arg.startswith('--')]
+            restart = '--restart' in sys.argv[2:]
+            if args:
                 # Process specific packages
-                codes = sys.argv[2].split(',')
+                codes = args[0].split(',')
                 manager.config['selected_training_packages'] = codes
-                manager.process_selected_packages()
-            else:
-                manager.process_selected_packages()
+            manager.process_selected_packages(restart=restart)
+        elif sys.argv[1] == 'reindex':
+            manager.rebuild_search_index(sys.argv[2].split(',') if len(sys.argv) > 2 else None)
         elif sys.argv[1] == 'status':
             manager.show_status()
         else:
-            print("Usage: python admin_update_manager.py [update_tps|process|status]")
+            print("Usage: python admin_update_manager.py [update_tps [--full]|process [codes] [--restart]|reindex [codes]|status]")
     else:
         # Interactive mode
         manager = UpdateManager()
@@ -0,0 +1,27 @@
+"""
+Atomic file writes for the update scripts' state files
+The text goes to a temp file in the target's directory, which is then renamed
+over the target, so readers (and a run that was interrupted mid-write) only
+ever see the old file or the complete new one.
+"""
+
+import json
+import os
+import tempfile
+
+def write_atomic(path, text):
+    """Replace path with text (temp file then rename), creating its directory if needed"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def write_json_atomic(path, data, sort_keys=False):
+    """Replace path with data as indented JSON"""
+    write_atomic(path, json.dumps(data, indent=2, sort_keys=sort_keys))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the training package sync
+Runs update_tps end to end (Search, upsert into lol_tps, GetDetails and XML
+downloads) against the local stand-in in tga_stub.py, at several catalogue
+sizes. Each size is synced three times:
+  cold     empty lol_tps and XML store, every package is new
+  warm     same catalogue again, nothing has changed
+  changed  every package has a new release, so all are fresher
+Each pass runs in its own process so peak RSS and module state are per pass.
+
+Needs a scratch MySQL database named by BENCH_DB_NAME (DB_USER, DB_PASSWORD,
+DB_HOST and DB_PORT as usual). Its lol_tps table is created if missing and
+emptied before each catalogue size.
+
+Usage: python bench_sync.py [--scales 100,1000,10000] [--workers 8] [--batch-size 50]
+                            [--latency-ms 0] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+
+PASSES = (('cold', 1), ('warm', 1), ('changed', 2))
+
+LOL_TPS_DDL = (
+    "CREATE TABLE IF NOT EXISTS `lol_tps` ("
+    "`tpID` int(11) NOT NULL AUTO_INCREMENT, "
+    "`tpCode` varchar(15) NOT NULL, "
+    "`tpTitle` varchar(500) NOT NULL, "
+    "`xmlFile` varchar(100) NOT NULL, "
+    "`ReleaseDate` varchar(50) NOT NULL, "
+    "`processed` char(1) NOT NULL DEFAULT 'N', "
+    "PRIMARY KEY (`tpID`), "
+    "UNIQUE KEY `tpCode` (`tpCode`))"
+)
+
+def reset_database(db_name):
+    """Create lol_tps in the scratch database if needed and empty it"""
+    import mysql.connector
+    cnx = mysql.connector.connect(
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST', '127.0.0.1'),
+        database=db_name,
+        port=int(os.getenv('DB_PORT', '3306'))
+    )
+    try:
+        cursor = cnx.cursor()
+        cursor.execute(LOL_TPS_DDL)
+        cursor.execute("TRUNCATE TABLE lol_tps")
+        cnx.commit()
+        cursor.close()
+    finally:
+        cnx.close()
+
+def run_child(workdir, result_path, workers, batch_size):
+    """Body of one pass, run in a fresh process with the stub's URLs in the environment"""
+    import resource
+    os.chdir(workdir)
+    sys.path.insert(0, SCRIPTS_DIR)
+    import update_tps
+    from sync_metrics import metrics
+
+    started = time.perf_counter()
+    response = update_tps.get_current_training_packages()
+    committed = bool(response) and update_tps.upsert_training_packages_to_db(
+        response, max_workers=workers, batch_size=batch_size
+    )
+    wall = time.perf_counter() - started
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with open(result_path, 'w') as f:
+        json.dump({
+            'committed': committed,
+            'wall_seconds': round(wall, 3),
+            'peak_rss_mb': round(peak_rss_mb, 1),
+            'metrics': metrics.summary()
+        }, f)
+
+def run_pass(stub, workdir, name, args):
+    """Run one sync pass in a subprocess; returns its result dict"""
+    result_path = os.path.join(workdir, f"{name}.json")
+    log_path = os.path.join(workdir, f"{name}.log")
+    env = dict(
+        os.environ,
+        TGA_WSDL_URL=stub.wsdl_url,
+        TGA_XML_BASE_URL=stub.xml_base_url,
+        TGA_WSDL_CACHE=os.path.join(workdir, 'wsdl_cache.db'),
+        DB_NAME=os.environ['BENCH_DB_NAME'],
+    )
+    command = [sys.executable, os.path.abspath(__file__), '--child', workdir, result_path,
+               '--workers', str(args.workers), '--batch-size', str(args.batch_size)]
+
+    stub.counter.reset()
+    with open(log_path, 'w') as log:
+        subprocess.run(command, env=env, stdout=log, stderr=subprocess.STDOUT, check=True)
+    with open(result_path) as f:
+        result = json.load(f)
+    result['stub'] = stub.counter.snapshot()
+    result['log'] = log_path
+    return result
+
+def db_writes(result):
+    """(rows written, write statements, commits) from the pass's sync metrics"""
+    phases = result['metrics']['phases']
+    write = phases.get('db_write', {})
+    return write.get('rows', 0), write.get('count', 0), phases.get('db_commit', {}).get('count', 0)
+
+def print_row(scale, name, result):
+    requests = result['stub']['requests']
+    soap = sum(requests.get(op, 0) for op in ('Search', 'SearchByModifiedDate', 'GetDetails'))
+    xml = sum(requests.get(key, 0) for key in ('xml_200', 'xml_304', 'xml_404'))
+    rows, statements, commits = db_writes(result)
+    print(f"{scale:>7} {name:<8} {result['wall_seconds']:>9.2f} "
+          f"{soap:>6} {requests.get('GetDetails', 0):>8} "
+          f"{xml:>6} {requests.get('xml_304', 0):>5} "
+          f"{result['stub']['bytes_sent'] / 1048576:>8.1f} "
+          f"{result['peak_rss_mb']:>8.1f} {rows:>7} {statements:>6} {commits:>7}"
+          f"{'' if result['committed'] else '  FAILED'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark update_tps against a local TGA stand-in")
+    parser.add_argument('--scales', default='100,1000,10000', help='Comma-separated catalogue sizes')
+    parser.add_argument('--workers', type=int, default=8, help='max_workers for XML downloads')
+    parser.add_argument('--batch-size', type=int, default=50, help='lol_tps upsert batch size')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay the stub adds to every response')
+    parser.add_argument('--output', help='Write all results to this JSON file')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directories (logs, XML store)')
+    parser.add_argument('--child', nargs=2, metavar=('WORKDIR', 'RESULT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.workers, args.batch_size)
+        return
+
+    db_name = os.getenv('BENCH_DB_NAME')
+    if not db_name:
+        print("Set BENCH_DB_NAME to a scratch database; its lol_tps table is emptied for every run")
+        sys.exit(1)
+
+    sys.path.insert(0, BENCH_DIR)
+    from tga_stub import SyntheticCatalogue, TgaStub
+
+    catalogue = SyntheticCatalogue(0)
+    stub = TgaStub(catalogue, latency=args.latency_ms / 1000)
+    print(f"Stub SOAP service at {stub.wsdl_url}, XML files at {stub.xml_base_url}")
+    print(f"{'scale':>7} {'pass':<8} {'wall (s)':>9} {'soap':>6} {'details':>8} "
+          f"{'xml':>6} {'304':>5} {'MB sent':>8} {'RSS MB':>8} {'rows':>7} {'stmts':>6} {'commits':>7}")
+
+    results = []
+    try:
+        for scale in (int(value) for value in args.scales.split(',')):
+            reset_database(db_name)
+            workdir = tempfile.mkdtemp(prefix=f"bench_sync_{scale}_")
+            catalogue.count = scale
+            for name, release in PASSES:
+                catalogue.release = release
+                result = run_pass(stub, workdir, name, args)
+                print_row(scale, name, result)
+                results.append(dict(result, scale=scale, name=name))
+            if args.keep:
+                print(f"  logs and XML store kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Local stand-in for training.gov.au used by the sync benchmarks
+Serves the fixture WSDL and synthetic Search, SearchByModifiedDate and
+GetDetails responses for a configurable number of training packages from one
+HTTP server, and the packages' XML files from a second, static-file style
+server that honours If-None-Match. Both count the requests they handle.
+
+Run on its own for manual testing:
+    python tga_stub.py --packages 1000
+then point TGA_WSDL_URL and TGA_XML_BASE_URL at the printed addresses.
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+WSDL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'TrainingComponentService.wsdl')
+SERVICE_NS = 'http://training.gov.au/services/12/2015/'
+SOAP_ENV_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+
+# Release dates of synthetic packages start here, one minute apart
+BASE_DATE = datetime(2024, 1, 1, 9, 0, 0)
+# Australian Eastern Standard Time, as the real service reports
+OFFSET_MINUTES = 600
+
+class SyntheticCatalogue:
+    """
+    count training packages BM00001..BMnnnnn at the given release.
+    Raising release moves every package's UpdatedDate forward a day and gives
+    it new XML file names, so a sync sees every package as fresher.
+    Every fourth package also has an assessment requirements file.
+    """
+
+    def __init__(self, count, release=1, units_per_package=3):
+        self.count = count
+        self.release = release
+        self.units_per_package = units_per_package
+
+    def codes(self):
+        return [f"BM{i:05d}" for i in range(1, self.count + 1)]
+
+    def index(self, code):
+        """Package number for a code, or None if it is not in the catalogue"""
+        if not code or not code.startswith('BM') or not code[2:].isdigit():
+            return None
+        number = int(code[2:])
+        return number if 1 <= number <= self.count else None
+
+    def title(self, code):
+        return f"Benchmark Training Package {code[2:]}"
+
+    def updated(self, code):
+        return BASE_DATE + timedelta(days=self.release - 1, minutes=self.index(code))
+
+    def files(self, code):
+        """RelativePaths of the current release's XML files"""
+        paths = [f"bench/{code}/{code}_R{self.release}.xml"]
+        if self.index(code) % 4 == 0:
+            paths.append(f"bench/{code}/{code}_AssessmentRequirements_R{self.release}.xml")
+        return paths
+
+    def xml_document(self, code, release):
+        """A small training package document in the shape tga_importer.py reads"""
+        parts = [f'<TrainingPackage xmlns="http://training.gov.au/bench"><Code>{code}</Code>']
+        parts.append(f"<Qualification><Code>{code}30{release:03d}</Code>"
+                     f"<Title>Certificate III in {escape(self.title(code))}</Title>")
+        for u in range(1, self.units_per_package + 1):
+            parts.append(f"<Unit><Code>{code}U{u:03d}</Code><Title>Reference</Title></Unit>")
+        parts.append("</Qualification>")
+        for u in range(1, self.units_per_package + 1):
+            unit_code = f"{code}U{u:03d}"
+            parts.append(f"<Unit><Code>{unit_code}</Code><Title>Apply benchmark skill {u} (release {release})</Title>")
+            for e in range(1, 4):
+                parts.append(f"<Element><Number>{e}</Number><Title>Carry out step {e} of {unit_code}</Title>")
+                for p in range(1, 4):
+                    parts.append(f"<PerformanceCriterion><Number>{e}.{p}</Number>"
+                                 f"<Text>Confirm safety requirement {e}.{p} is met for {unit_code}</Text>"
+                                 f"</PerformanceCriterion>")
+                parts.append("</Element>")
+            parts.append("<RequiredSkill><Text>communication skills to confirm work requirements</Text></RequiredSkill>")
+            parts.append("<RequiredKnowledge><Text>workplace health and safety procedures</Text></RequiredKnowledge>")
+            parts.append("</Unit>")
+        parts.append("</TrainingPackage>")
+        return "".join(parts).encode('utf-8')
+
+class RequestCounter:
+    """Thread-safe tally of requests handled by the stub servers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+            self.bytes_sent = 0
+
+    def add(self, key, bytes_sent=0):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.bytes_sent += bytes_sent
+
+    def snapshot(self):
+        with self.lock:
+            return {'requests': dict(self.counts), 'bytes_sent': self.bytes_sent}
+
+def _date_time_offset(tag, value):
+    return (f"<{tag}><DateTime>{value.isoformat()}</DateTime>"
+            f"<OffsetMinutes>{OFFSET_MINUTES}</OffsetMinutes></{tag}>")
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _find_text(element, path):
+    """Text of the first descendant matching a /-separated path of local names"""
+    for name in path.split('/'):
+        if element is None:
+            return None
+        element = next((child for child in element if _local_name(child.tag) == name), None)
+    return element.text if element is not None else None
+
+def _parse_date(text):
+    if not text:
+        return None
+    value = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    return value.replace(tzinfo=None)
+
+class SoapHandler(BaseHTTPRequestHandler):
+    """Serves the WSDL on GET and answers the three operations on POST"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, key):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.counter.add(key, len(body))
+
+    def do_GET(self):
+        with open(WSDL_PATH, 'rb') as f:
+            wsdl = f.read()
+        address = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}/TrainingComponentService.svc"
+        self._send(200, wsdl.replace(b'SERVICE_ADDRESS', address.encode()), 'wsdl')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        envelope = ET.fromstring(self.rfile.read(length))
+        body = next(child for child in envelope if _local_name(child.tag) == 'Body')
+        operation_element = body[0]
+        operation = _local_name(operation_element.tag)
+        request = next((child for child in operation_element if _local_name(child.tag) == 'request'), None)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        handler = {
+            'Search': self.search,
+            'SearchByModifiedDate': self.search_by_modified_date,
+            'GetDetails': self.get_details,
+        }.get(operation)
+        if handler is None:
+            self._send(500, self._fault(f"Unknown operation {operation}"), 'unknown')
+            return
+        self._send(200, self._envelope(handler(request)), operation)
+
+    def _envelope(self, content):
+        return (f'<s:Envelope xmlns:s="{SOAP_ENV_NS}"><s:Body>{content}</s:Body></s:Envelope>').encode('utf-8')
+
+    def _fault(self, message):
+        return self._envelope(f"<s:Fault><faultcode>s:Client</faultcode><faultstring>{escape(message)}</faultstring></s:Fault>")
+
+    def _search_result(self, element, codes, request):
+        catalogue = self.server.catalogue
+        page_number = int(_find_text(request, 'PageNumber') or 0)
+        page_size = int(_find_text(request, 'PageSize') or 0)
+        total = len(codes)
+        if page_size > 0:
+            start = (max(page_number, 1) - 1) * page_size
+            codes = codes[start:start + page_size]
+
+        summaries = "".join(
+            f"<TrainingComponentSummary><Code>{code}</Code><ComponentType>TrainingPackage</ComponentType>"
+            f"{_date_time_offset('CreatedDate', BASE_DATE)}<Title>{escape(catalogue.title(code))}</Title>"
+            f"{_date_time_offset('UpdatedDate', catalogue.updated(code))}</TrainingComponentSummary>"
+            for code in codes
+        )
+        return (f'<{element}Response xmlns="{SERVICE_NS}"><{element}Result>'
+                f"<Count>{total}</Count><PageNumber>{page_number}</PageNumber><PageSize>{page_size}</PageSize>"
+                f"<Results>{summaries}</Results></{element}Result></{element}Response>")
+
+    def search(self, request):
+        return self._search_result('Search', self.server.catalogue.codes(), request)
+
+    def search_by_modified_date(self, request):
+        catalogue = self.server.catalogue
+        start = _parse_date(_find_text(request, 'StartDate/DateTime')) or datetime.min
+        end = _parse_date(_find_text(request, 'EndDate/DateTime')) or datetime.max
+        codes = [code for code in catalogue.codes() if start <= catalogue.updated(code) <= end]
+        return self._search_result('SearchByModifiedDate', codes, request)
+
+    def get_details(self, request):
+        catalogue = self.server.catalogue
+        code = _find_text(request, 'Code')
+        if catalogue.index(code) is None:
+            return f'<GetDetailsResponse xmlns="{SERVICE_NS}"/>'
+
+        files = "".join(
+            f"<ReleaseFile><RelativePath>{escape(path)}</RelativePath></ReleaseFile>"
+            for path in catalogue.files(code)
+        )
+        releases = [
+            # Superseded releases carry a file too, so the client has to pick the current one
+            f"<Release><Currency>Superseded</Currency><Files><ReleaseFile><RelativePath>"
+            f"bench/{code}/{code}_R{release}.xml</RelativePath></ReleaseFile></Files>"
+            f"<ReleaseNumber>{release}</ReleaseNumber></Release>"
+            for release in range(1, catalogue.release)
+        ]
+        releases.append(f"<Release><Currency>Current</Currency><Files>{files}</Files>"
+                        f"<ReleaseNumber>{catalogue.release}</ReleaseNumber></Release>")
+        return (f'<GetDetailsResponse xmlns="{SERVICE_NS}"><GetDetailsResult>'
+                f"<Code>{code}</Code><Releases>{''.join(releases)}</Releases>"
+                f"<Title>{escape(catalogue.title(code))}</Title></GetDetailsResult></GetDetailsResponse>")
+
+class XmlFileHandler(BaseHTTPRequestHandler):
+    """Serves bench/{code}/{code}_..._R{release}.xml with ETag and Last-Modified headers"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _status(self, status, key):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        self.server.counter.add(key)
+
+    def do_GET(self):
+        catalogue = self.server.catalogue
+        parts = self.path.lstrip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'bench' or catalogue.index(parts[1]) is None:
+            self._status(404, 'xml_404')
+            return
+        code, filename = parts[1], parts[2]
+        stem, _, release = filename.rpartition('_R')
+        if not release.endswith('.xml') or not release[:-4].isdigit() or not stem.startswith(code):
+            self._status(404, 'xml_404')
+            return
+        release = int(release[:-4])
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        body = catalogue.xml_document(code, release)
+        if 'AssessmentRequirements' in stem:
+            body = body.replace(b'<TrainingPackage', b'<AssessmentRequirements', 1).replace(
+                b'</TrainingPackage>', b'</AssessmentRequirements>')
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+        if self.headers.get('If-None-Match') == etag:
+            self._status(304, 'xml_304')
+            return
+
+        released = BASE_DATE + timedelta(days=release - 1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', format_datetime(released.replace(tzinfo=timezone.utc), usegmt=True))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.counter.add('xml_200', len(body))
+
+def _serve(handler, catalogue, counter, latency, port):
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    server.catalogue = catalogue
+    server.counter = counter
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class TgaStub:
+    """
+    Starts the SOAP and XML servers on localhost.
+    wsdl_url and xml_base_url are the values for TGA_WSDL_URL and TGA_XML_BASE_URL.
+    latency (seconds) is added to every SOAP call and XML file response.
+    """
+
+    def __init__(self, catalogue, latency=0.0, soap_port=0, xml_port=0):
+        self.catalogue = catalogue
+        self.counter = RequestCounter()
+        self.soap_server = _serve(SoapHandler, catalogue, self.counter, latency, soap_port)
+        self.xml_server = _serve(XmlFileHandler, catalogue, self.counter, latency, xml_port)
+        soap_host, soap_port = self.soap_server.server_address
+        xml_host, xml_port = self.xml_server.server_address
+        self.wsdl_url = f"http://{soap_host}:{soap_port}/TrainingComponentService.svc?wsdl"
+        self.xml_base_url = f"http://{xml_host}:{xml_port}/"
+
+    def stop(self):
+        for server in (self.soap_server, self.xml_server):
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local training.gov.au stand-in")
+    parser.add_argument('--packages', type=int, default=100, help='Number of synthetic training packages')
+    parser.add_argument('--release', type=int, default=1, help='Current release of every package')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response')
+    parser.add_argument('--soap-port', type=int, default=8701)
+    parser.add_argument('--xml-port', type=int, default=8702)
+    args = parser.parse_args()
+
+    stub = TgaStub(SyntheticCatalogue(args.packages, args.release), args.latency_ms / 1000,
+                   args.soap_port, args.xml_port)
+    print(f"TGA_WSDL_URL={stub.wsdl_url}")
+    print(f"TGA_XML_BASE_URL={stub.xml_base_url}")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,73 @@
+"""
+Shared MySQL connection pool for the update scripts
+update_tps.py, admin_update_manager.py and the importer stages borrow
+connections from one pool per process instead of connecting for every step.
+A borrowed connection is returned to the pool by calling close().
+
+Environment variables: DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, DB_PORT and
+DB_POOL_SIZE (connections kept open, default 5, at most 32).
+"""
+
+import os
+import threading
+import time
+from mysql.connector import errors, pooling
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def db_config():
+    """Connection settings from environment variables"""
+    return {
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'host': os.getenv('DB_HOST', '127.0.0.1'),
+        'database': os.getenv('DB_NAME'),
+        'port': int(os.getenv('DB_PORT', '3306'))
+    }
+
+def get_pool():
+    """Create the pool on first use; the pool opens DB_POOL_SIZE connections up front"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool_size = min(max(1, int(os.getenv('DB_POOL_SIZE', '5'))), pooling.CNX_POOL_MAXSIZE)
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name='lol_scripts',
+                    pool_size=pool_size,
+                    pool_reset_session=True,
+                    **db_config()
+                )
+    return _pool
+
+def get_connection(timeout=30):
+    """
+    Borrow a connection from the pool, waiting up to timeout seconds if all are in use.
+    The connection is pinged (reconnecting if the server dropped it) before it is handed out.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            cnx = get_pool().get_connection()
+            break
+        except errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.1)
+
+    try:
+        cnx.ping(reconnect=True, attempts=3, delay=1)
+    except errors.Error:
+        cnx.close()
+        raise
+    return cnx
+
+def prepared_cursor(cnx):
+    """
+    Cursor that prepares its statement once on the server and reuses it.
+    For point queries run repeatedly with different parameters; batched
+    executemany INSERTs should keep using a plain cursor, which rewrites
+    them into a single multi-row statement.
+    """
+    return cnx.cursor(prepared=True)
@@ -0,0 +1,80 @@
+"""
+Job journal for training package syncs
+Records which stages have been committed for each tpCode so an interrupted job
+can pick up where it left off instead of starting over. Stored as JSON beside
+update_config.json.
+"""
+
+import json
+from datetime import datetime
+
+from atomic_file import write_json_atomic
+
+class SyncJournal:
+    def __init__(self, path='sync_journal.json'):
+        self.path = path
+        self.load()
+
+    def load(self):
+        """Load the journal from disk, starting empty if it doesn't exist"""
+        try:
+            with open(self.path, 'r') as f:
+                self.jobs = json.load(f)
+        except FileNotFoundError:
+            self.jobs = {}
+        except ValueError:
+            print(f"Warning: Could not read job journal {self.path}, starting a new one")
+            self.jobs = {}
+
+    def save(self):
+        """Write the journal atomically (temp file then rename)"""
+        write_json_atomic(self.path, self.jobs)
+
+    def start(self, job, tp_codes, stages, restart=False):
+        """
+        Begin a job, or resume the unfinished one for the same packages and stages.
+        Returns True if an earlier run is being resumed.
+        """
+        existing = self.jobs.get(job)
+        if (not restart and existing
+                and sorted(existing['tp_codes']) == sorted(tp_codes)
+                and existing['stages'] == list(stages)):
+            return True
+
+        self.jobs[job] = {
+            'started': datetime.now().isoformat(),
+            'tp_codes': list(tp_codes),
+            'stages': list(stages),
+            'completed': {}
+        }
+        self.save()
+        return False
+
+    def is_done(self, job, tp_code, stage):
+        completed = self.jobs.get(job, {}).get('completed', {})
+        return stage in completed.get(tp_code, {})
+
+    def pending(self, job, tp_codes, stage):
+        """The tpCodes that have not yet completed a stage"""
+        return [code for code in tp_codes if not self.is_done(job, code, stage)]
+
+    def mark_done(self, job, tp_codes, stage):
+        """Record that a stage has been committed for the given tpCodes"""
+        completed = self.jobs[job]['completed']
+        now = datetime.now().isoformat()
+        for code in tp_codes:
+            completed.setdefault(code, {})[stage] = now
+        self.save()
+
+    def progress(self, job):
+        """Tuple: (completed package stages, total package stages)"""
+        entry = self.jobs.get(job)
+        if not entry:
+            return 0, 0
+        done = sum(len(stages) for stages in entry['completed'].values())
+        return done, len(entry['tp_codes']) * len(entry['stages'])
+
+    def finish(self, job):
+        """Remove a job once every stage has completed"""
+        if self.jobs.pop(job, None) is not None:
+            self.save()
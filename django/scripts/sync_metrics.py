@@ -0,0 +1,172 @@
+"""
+Per-phase metrics for the TGA sync
+Records call latency (as a histogram), bytes, rows, errors and outcome
+counters for each phase of update_tps (SOAP Search, GetDetails, XML downloads,
+MySQL reads and writes). The shared `metrics` instance is written out as a JSON
+summary and as a Prometheus text-format file at the end of a sync.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from atomic_file import write_atomic
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _new_phase():
+    return {
+        'count': 0,
+        'seconds': 0.0,
+        'max_seconds': 0.0,
+        'buckets': [0] * len(BUCKETS),
+        'errors': 0,
+        'bytes': 0,
+        'rows': 0,
+        'outcomes': {}
+    }
+
+def _quantile(phase, q):
+    """Estimate a latency quantile from the histogram (upper bound of the bucket it falls in)"""
+    if not phase['count']:
+        return 0.0
+    target = q * phase['count']
+    seen = 0
+    for bound, count in zip(BUCKETS, phase['buckets']):
+        seen += count
+        if seen >= target:
+            return round(min(bound, phase['max_seconds']), 3)
+    return round(phase['max_seconds'], 3)
+
+class SyncMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all phases and restart the run clock"""
+        with self.lock:
+            self.phases = {}
+            self.started = time.time()
+
+    def _phase(self, name):
+        # Caller holds the lock
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _new_phase()
+        return phase
+
+    def observe(self, name, seconds):
+        """Record one call's latency"""
+        with self.lock:
+            phase = self._phase(name)
+            phase['count'] += 1
+            phase['seconds'] += seconds
+            phase['max_seconds'] = max(phase['max_seconds'], seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    phase['buckets'][i] += 1
+                    break
+
+    @contextmanager
+    def timer(self, name):
+        """Time a block as one call of a phase; an exception escaping the block counts as an error"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.add_error(name)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def add_error(self, name, count=1):
+        with self.lock:
+            self._phase(name)['errors'] += count
+
+    def add_bytes(self, name, count):
+        with self.lock:
+            self._phase(name)['bytes'] += count
+
+    def add_rows(self, name, count):
+        with self.lock:
+            self._phase(name)['rows'] += count
+
+    def add_outcome(self, name, outcome):
+        """Count a result such as 'downloaded' or 'unchanged'"""
+        with self.lock:
+            outcomes = self._phase(name)['outcomes']
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def summary(self):
+        """Dict of run totals and per-phase metrics, ready for json.dump"""
+        with self.lock:
+            phases = {}
+            for name, phase in self.phases.items():
+                phases[name] = {
+                    'count': phase['count'],
+                    'errors': phase['errors'],
+                    'seconds': round(phase['seconds'], 3),
+                    'mean_seconds': round(phase['seconds'] / phase['count'], 3) if phase['count'] else 0.0,
+                    'p50_seconds': _quantile(phase, 0.5),
+                    'p95_seconds': _quantile(phase, 0.95),
+                    'max_seconds': round(phase['max_seconds'], 3),
+                    'bytes': phase['bytes'],
+                    'rows': phase['rows'],
+                    'outcomes': dict(phase['outcomes']),
+                    'histogram': dict(zip((str(b) for b in BUCKETS), phase['buckets']))
+                }
+            return {
+                'started': self.started,
+                'elapsed_seconds': round(time.time() - self.started, 3),
+                'phases': phases
+            }
+
+    def prometheus_text(self, prefix='lol_tga_sync'):
+        """Render the metrics in the Prometheus text exposition format"""
+        with self.lock:
+            lines = [
+                f"# HELP {prefix}_phase_seconds Latency of TGA sync calls by phase",
+                f"# TYPE {prefix}_phase_seconds histogram",
+            ]
+            for name, phase in sorted(self.phases.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, phase['buckets']):
+                    cumulative += count
+                    lines.append(f'{prefix}_phase_seconds_bucket{{phase="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{name}",le="+Inf"}} {phase["count"]}')
+                lines.append(f'{prefix}_phase_seconds_sum{{phase="{name}"}} {phase["seconds"]:.6f}')
+                lines.append(f'{prefix}_phase_seconds_count{{phase="{name}"}} {phase["count"]}')
+
+            for metric, key, help_text in (
+                ('errors_total', 'errors', 'Errors by phase'),
+                ('bytes_total', 'bytes', 'Bytes transferred by phase'),
+                ('rows_total', 'rows', 'Database rows by phase'),
+            ):
+                lines.append(f"# HELP {prefix}_{metric} {help_text}")
+                lines.append(f"# TYPE {prefix}_{metric} counter")
+                for name, phase in sorted(self.phases.items()):
+                    lines.append(f'{prefix}_{metric}{{phase="{name}"}} {phase[key]}')
+
+            lines.append(f"# HELP {prefix}_outcomes_total Call results by phase and outcome")
+            lines.append(f"# TYPE {prefix}_outcomes_total counter")
+            for name, phase in sorted(self.phases.items()):
+                for outcome, count in sorted(phase['outcomes'].items()):
+                    lines.append(f'{prefix}_outcomes_total{{phase="{name}",outcome="{outcome}"}} {count}')
+
+            lines.append(f"# HELP {prefix}_last_run_timestamp_seconds Start time of the last sync")
+            lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+            lines.append(f"{prefix}_last_run_timestamp_seconds {self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        write_atomic(path, json.dumps(self.summary(), indent=2) + "\n")
+
+    def write_prometheus(self, path):
+        """Write the text format atomically, as the node_exporter textfile collector expects"""
+        write_atomic(path, self.prometheus_text())
+
+# Shared by update_tps, tga_async and admin_update_manager
+metrics = SyncMetrics()
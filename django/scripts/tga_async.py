@@ -0,0 +1,108 @@
+"""
+Asynchronous GetDetails requests against the TrainingComponentService
+Uses zeep's AsyncClient (httpx) to run many GetDetails calls at once, limited by
+a token-bucket rate limiter, a concurrency cap and a per-request timeout.
+Requires the zeep async extras: pip install "zeep[async]"
+"""
+
+import asyncio
+import time
+import httpx
+from zeep import AsyncClient, Settings
+from zeep.cache import SqliteCache
+from zeep.transports import AsyncTransport
+from zeep.wsse.username import UsernameToken
+
+import update_tps
+from sync_metrics import metrics
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def create_async_client(concurrency=20, timeout=30.0):
+    """
+    Build an AsyncClient with the same credentials, WSDL cache and settings as
+    update_tps.get_client(). Loading the WSDL itself is still synchronous.
+    timeout is the httpx timeout in seconds; zeep only applies its own to
+    clients it creates, so without it httpx's 5 second default would apply.
+    """
+    auth = httpx.BasicAuth(update_tps.username, update_tps.password)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    transport = AsyncTransport(
+        client=httpx.AsyncClient(auth=auth, limits=limits, timeout=httpx.Timeout(timeout)),
+        wsdl_client=httpx.Client(auth=auth, timeout=httpx.Timeout(timeout)),
+        cache=SqliteCache(path=update_tps.wsdl_cache_path, timeout=update_tps.wsdl_cache_ttl)
+    )
+    settings = Settings(strict=False, xml_huge_tree=True)
+    return AsyncClient(
+        wsdl=update_tps.wsdl_url,
+        transport=transport,
+        wsse=UsernameToken(update_tps.username, update_tps.password),
+        settings=settings
+    )
+
+async def fetch_xml_file_infos(codes, concurrency=20, rate_limit=10.0, timeout=30.0, debug=False):
+    """
+    Run GetDetails for many codes concurrently.
+    At most `concurrency` requests are in flight, new requests start at no more
+    than `rate_limit` per second, and each request is abandoned after `timeout` seconds.
+    Returns dict: code -> (xml_filename, relative_path, assessment_requirements_file) or None.
+    Codes whose request failed or timed out are left out so callers can retry them.
+    """
+    client = create_async_client(concurrency, timeout)
+    bucket = TokenBucket(rate_limit)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async def fetch(code):
+        async with semaphore:
+            await bucket.acquire()
+            if debug:
+                print(f"Getting XML for {code}")
+            try:
+                with metrics.timer('get_details'):
+                    response = await asyncio.wait_for(
+                        client.service.GetDetails(request=update_tps.details_request(code)),
+                        timeout
+                    )
+            except asyncio.TimeoutError:
+                metrics.add_outcome('get_details', 'timeout')
+                print(f"Timed out getting XML info for {code} after {timeout}s")
+                return
+            except Exception as e:
+                print(f"Error getting XML info for {code}: {e}")
+                return
+            results[code] = update_tps.extract_xml_file_info(code, response, debug)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(fetch(code) for code in codes))
+    finally:
+        await client.transport.aclose()
+        client.transport.wsdl_client.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Fetched details for {len(results)} of {len(codes)} components in {elapsed:.2f}s")
+    return results
+
+def get_xml_file_infos(codes, concurrency=20, rate_limit=10.0, timeout=30.0, debug=False):
+    """Synchronous wrapper around fetch_xml_file_infos()"""
+    return asyncio.run(fetch_xml_file_infos(codes, concurrency, rate_limit, timeout, debug))
@@ -0,0 +1,364 @@
+"""
+Streaming importer for downloaded training.gov.au XML
+Reads a package's XML from the compressed store (xml_store.py) with lxml
+iterparse, clearing each element
+once it has been handled, and yields qualification, unit, element, performance
+criterion and required skill records. The records are written to MySQL in
+batches, so memory use stays flat regardless of file size.
+"""
+
+import time
+import zlib
+from lxml import etree
+
+from xml_store import XmlStore
+
+# Local names (namespace stripped) of the XML elements the importer reads.
+# Adjust here if the TGA schema changes.
+TAGS = {
+    'qualification': 'Qualification',
+    'unit': 'Unit',
+    'element': 'Element',
+    'pc': 'PerformanceCriterion',
+    'required_skill': 'RequiredSkill',
+    'required_knowledge': 'RequiredKnowledge',
+    'code': 'Code',
+    'title': 'Title',
+    'number': 'Number',
+    'text': 'Text',
+    'core': 'IsEssential',
+}
+
+# Record types produced by iter_records(), in the order they are written
+RECORD_TYPES = ('qualification', 'qual_unit', 'unit', 'element', 'pc', 'required_skill')
+
+# Batched upserts per record type, keyed on each table's unique index
+UPSERT_QUERIES = {
+    'qualification': (
+        "INSERT INTO lol_quals (qualCode, qualTitle, tpCode) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE qualTitle = VALUES(qualTitle), tpCode = VALUES(tpCode)"
+    ),
+    'qual_unit': (
+        "INSERT INTO lol_qual_units (qualCode, unitCode, isCore, tpCode) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE isCore = VALUES(isCore), tpCode = VALUES(tpCode)"
+    ),
+    'unit': (
+        "INSERT INTO lol_units (unitCode, unitTitle, tpCode) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE unitTitle = VALUES(unitTitle), tpCode = VALUES(tpCode)"
+    ),
+    'element': (
+        "INSERT INTO lol_elements (unitCode, elementNum, elementText, tpCode) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE elementText = VALUES(elementText), tpCode = VALUES(tpCode)"
+    ),
+    'pc': (
+        "INSERT INTO lol_pcs (unitCode, elementNum, pcNum, pcText, tpCode) VALUES (%s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE pcText = VALUES(pcText), tpCode = VALUES(tpCode)"
+    ),
+    'required_skill': (
+        "INSERT INTO lol_required_skills (unitCode, skillType, skillNum, skillText, tpCode) VALUES (%s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE skillText = VALUES(skillText), tpCode = VALUES(tpCode)"
+    ),
+}
+
+# Child rows that are replaced wholesale when a package is re-imported, so
+# units dropped from a qualification and elements/PCs dropped from a new
+# release don't linger
+DELETE_QUERIES = {
+    'qual_unit': "DELETE FROM lol_qual_units WHERE tpCode = %s",
+    'element': "DELETE FROM lol_elements WHERE tpCode = %s",
+    'pc': "DELETE FROM lol_pcs WHERE tpCode = %s",
+    'required_skill': "DELETE FROM lol_required_skills WHERE tpCode = %s",
+}
+
+# Record types whose text feeds the lol_search full-text index
+SEARCH_RECORD_TYPES = ('unit', 'element', 'pc')
+
+# One lol_search row per unit: its title plus all element and PC text.
+# Rebuilt per package from the lol_* tables in the same transaction as the import.
+# The delete only covers this package, so a unit whose row is still filed under
+# another package (it moved, or both packages release the code) is updated in
+# place; lol_units already files it under the package imported last.
+SEARCH_DELETE_QUERY = "DELETE FROM lol_search WHERE tpCode = %s"
+SEARCH_INSERT_QUERY = (
+    "INSERT INTO lol_search (unitCode, unitTitle, body, tpCode) "
+    "SELECT u.unitCode, u.unitTitle, CONCAT_WS('\\n', "
+    "(SELECT GROUP_CONCAT(e.elementText ORDER BY e.elementNum SEPARATOR '\\n') "
+    "FROM lol_elements e WHERE e.unitCode = u.unitCode), "
+    "(SELECT GROUP_CONCAT(p.pcText ORDER BY p.elementNum, p.pcNum SEPARATOR '\\n') "
+    "FROM lol_pcs p WHERE p.unitCode = u.unitCode)), u.tpCode "
+    "FROM lol_units u WHERE u.tpCode = %s "
+    "ON DUPLICATE KEY UPDATE unitTitle = VALUES(unitTitle), body = VALUES(body), tpCode = VALUES(tpCode)"
+)
+
+class PackageParseError(Exception):
+    """A training package's XML could not be read in full, so none of it should be written"""
+
+def _local_name(tag):
+    """Strip the namespace from an lxml tag"""
+    if not isinstance(tag, str):
+        return None
+    return tag.rsplit('}', 1)[-1]
+
+def _text(elem):
+    """Whitespace-normalised text content of an element, including nested markup"""
+    return ' '.join(''.join(elem.itertext()).split())
+
+def _release(elem):
+    """Free a handled element and the siblings parsed before it"""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+def _in_qualification(stack):
+    """True if any open record on the stack is a qualification"""
+    return any(kind == 'qualification' for kind, _ in stack)
+
+def _qualification_code(stack):
+    """Code of the innermost open qualification on the stack"""
+    for kind, fields in reversed(stack):
+        if kind == 'qualification':
+            return fields.get('code')
+    return None
+
+def iter_records(source, tp_code):
+    """
+    Stream records from one XML file (a path or a binary file object).
+    Yields tuple: (record_type, row) where row matches the columns in UPSERT_QUERIES
+    """
+    record_tags = {
+        TAGS['qualification']: 'qualification',
+        TAGS['unit']: 'unit',
+        TAGS['element']: 'element',
+        TAGS['pc']: 'pc',
+        TAGS['required_skill']: 'skill',
+        TAGS['required_knowledge']: 'knowledge',
+    }
+    field_tags = {
+        TAGS['code']: 'code',
+        TAGS['title']: 'title',
+        TAGS['number']: 'number',
+        TAGS['text']: 'text',
+        TAGS['core']: 'core',
+    }
+
+    # Open record elements, innermost last: [kind, fields]
+    stack = []
+    unit_code = None
+    element_num = None
+    pc_count = 0
+    skill_counts = {}
+
+    for event, elem in etree.iterparse(source, events=('start', 'end'), huge_tree=True):
+        name = _local_name(elem.tag)
+
+        if event == 'start':
+            kind = record_tags.get(name)
+            if kind:
+                stack.append([kind, {}])
+                if kind == 'unit' and not _in_qualification(stack[:-1]):
+                    unit_code = None
+                    skill_counts = {}
+                elif kind == 'element':
+                    element_num = None
+                    pc_count = 0
+            continue
+
+        field = field_tags.get(name)
+        if field and stack:
+            fields = stack[-1][1]
+            # First occurrence wins, nested records keep their own fields
+            if field not in fields:
+                fields[field] = _text(elem)
+                kind = stack[-1][0]
+                if kind == 'unit' and field == 'code' and not _in_qualification(stack[:-1]):
+                    unit_code = fields[field]
+                elif kind == 'element' and field == 'number':
+                    element_num = fields[field]
+            continue
+
+        kind = record_tags.get(name)
+        if not kind or not stack:
+            continue
+
+        kind, fields = stack.pop()
+        in_qualification = _in_qualification(stack)
+
+        if kind == 'qualification':
+            if fields.get('code'):
+                yield 'qualification', (fields['code'], fields.get('title', ''), tp_code)
+        elif kind == 'unit':
+            # Units listed inside a qualification are references, not definitions:
+            # they become the qualification's packaging links
+            if in_qualification:
+                qual_code = _qualification_code(stack)
+                if qual_code and fields.get('code'):
+                    is_core = 1 if fields.get('core', '').lower() in ('true', '1', 'yes', 'core') else 0
+                    yield 'qual_unit', (qual_code, fields['code'], is_core, tp_code)
+            elif fields.get('code'):
+                yield 'unit', (fields['code'], fields.get('title', ''), tp_code)
+        elif kind == 'element':
+            if unit_code and element_num:
+                yield 'element', (unit_code, element_num, fields.get('title') or fields.get('text', ''), tp_code)
+        elif kind == 'pc':
+            pc_count += 1
+            if unit_code and element_num:
+                pc_num = fields.get('number') or f"{element_num}.{pc_count}"
+                yield 'pc', (unit_code, element_num, pc_num, fields.get('text') or _text(elem), tp_code)
+        elif kind in ('skill', 'knowledge'):
+            if unit_code:
+                skill_counts[kind] = skill_counts.get(kind, 0) + 1
+                text = fields.get('text') or _text(elem)
+                if text:
+                    yield 'required_skill', (unit_code, kind, skill_counts[kind], text, tp_code)
+
+        _release(elem)
+
+def package_xml_files(tp_code, xml_dir='xml'):
+    """List the store keys ("tp_code/filename") of a training package's downloaded XML files"""
+    return XmlStore(xml_dir).package_files(tp_code)
+
+def iter_package_records(tp_code, record_types=RECORD_TYPES, xml_dir='xml'):
+    """
+    Stream records of the requested types from every XML file of a training package.
+    Raises PackageParseError if a file can't be read to the end: the records
+    already yielded are incomplete, so the caller must not commit them.
+    """
+    store = XmlStore(xml_dir)
+    for key in store.package_files(tp_code):
+        try:
+            with store.open(key) as source:
+                for record_type, row in iter_records(source, tp_code):
+                    if record_type in record_types:
+                        yield record_type, row
+        # A corrupt store object fails mid-read with EOFError or zlib.error rather than OSError
+        except (etree.XMLSyntaxError, OSError, EOFError, zlib.error) as e:
+            raise PackageParseError(f"Error parsing {key}: {e}") from e
+
+class RecordWriter:
+    """Buffers records per type and writes them with executemany in batches"""
+
+    def __init__(self, cursor, batch_size=50):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.buffers = {record_type: [] for record_type in RECORD_TYPES}
+        self.counts = {record_type: 0 for record_type in RECORD_TYPES}
+
+    def add(self, record_type, row):
+        buffer = self.buffers[record_type]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(record_type)
+
+    def flush(self, record_type):
+        buffer = self.buffers[record_type]
+        if buffer:
+            self.cursor.executemany(UPSERT_QUERIES[record_type], buffer)
+            self.counts[record_type] += len(buffer)
+            self.buffers[record_type] = []
+
+    def flush_all(self):
+        # Parents before children so a partial failure leaves consistent data
+        for record_type in RECORD_TYPES:
+            self.flush(record_type)
+
+def write_package_records(cnx, tp_code, records, record_types=RECORD_TYPES, batch_size=50):
+    """
+    Replace one training package's rows with the given records and commit.
+    records is any iterable of (record_type, row); returns the per-type record counts.
+    If records raises part way (PackageParseError), the deletes and writes are
+    rolled back and the error re-raised, so the package keeps its old rows.
+    """
+    cursor = cnx.cursor()
+    try:
+        for record_type, query in DELETE_QUERIES.items():
+            if record_type in record_types:
+                cursor.execute(query, (tp_code,))
+
+        writer = RecordWriter(cursor, batch_size)
+        for record_type, row in records:
+            writer.add(record_type, row)
+        writer.flush_all()
+        if any(record_type in SEARCH_RECORD_TYPES for record_type in record_types):
+            refresh_search_index(cursor, tp_code)
+        cnx.commit()
+        return writer.counts
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def refresh_search_index(cursor, tp_code):
+    """Replace a package's lol_search rows from its units, elements and PCs (caller commits)"""
+    # GROUP_CONCAT stops at 1024 bytes by default, well short of a unit's PC text
+    cursor.execute("SET SESSION group_concat_max_len = 4194304")
+    cursor.execute(SEARCH_DELETE_QUERY, (tp_code,))
+    cursor.execute(SEARCH_INSERT_QUERY, (tp_code,))
+
+def rebuild_search_index(cnx, tp_codes):
+    """Rebuild lol_search for packages imported before the index existed, one commit per package"""
+    cursor = cnx.cursor()
+    try:
+        for tp_code in tp_codes:
+            refresh_search_index(cursor, tp_code)
+            cnx.commit()
+            print(f"{tp_code}: search index rebuilt")
+    finally:
+        cursor.close()
+
+def parse_package(tp_code, record_types=RECORD_TYPES, xml_dir='xml'):
+    """
+    Parse a training package's XML into a list of (record_type, row) tuples.
+    Used by the pipeline's parse stage, which runs in worker processes. The
+    whole package is held in memory so it can be sent back to the pipeline.
+    """
+    return list(iter_package_records(tp_code, record_types, xml_dir))
+
+def import_training_package(cnx, tp_code, record_types=RECORD_TYPES, batch_size=50, xml_dir='xml'):
+    """
+    Import one training package's XML into the lol_* tables.
+    Records are streamed straight from the parser to the writer, then committed
+    once the package is written. Returns the per-type record counts.
+    """
+    started = time.perf_counter()
+    records = iter_package_records(tp_code, record_types, xml_dir)
+    counts = write_package_records(cnx, tp_code, records, record_types, batch_size)
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"{tp_code}: {total} records in {elapsed:.2f}s ({rate:.0f} records/s)")
+    return counts
+
+def import_training_packages(cnx, tp_codes, record_types=RECORD_TYPES, batch_size=50, xml_dir='xml',
+                             on_committed=None):
+    """
+    Import several training packages, returning total record counts per type.
+    on_committed(tp_code, counts) is called after each package is committed.
+    A package whose XML can't be read is rolled back and skipped, without
+    on_committed, so it is left for the next run.
+    """
+    totals = {record_type: 0 for record_type in RECORD_TYPES}
+    started = time.perf_counter()
+
+    for tp_code in tp_codes:
+        if not package_xml_files(tp_code, xml_dir):
+            print(f"No XML files found for {tp_code} in {xml_dir}/{tp_code}")
+            continue
+        try:
+            counts = import_training_package(cnx, tp_code, record_types, batch_size, xml_dir)
+        except PackageParseError as e:
+            print(f"{tp_code} not imported: {e}")
+            continue
+        for record_type, count in counts.items():
+            totals[record_type] += count
+        if on_committed:
+            on_committed(tp_code, counts)
+
+    elapsed = time.perf_counter() - started
+    total = sum(totals.values())
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"Imported {total} records from {len(tp_codes)} packages in {elapsed:.2f}s ({rate:.0f} records/s)")
+    return totals
@@ -0,0 +1,211 @@
+"""
+Staged download -> parse -> load pipeline for training package processing
+Downloads run in threads, XML parsing runs in a process pool so every core is
+used, and database loading runs in threads with their own connections. The
+stages are joined by bounded queues, so a slow stage holds the earlier ones
+back instead of letting parsed records pile up in memory.
+
+Unlike the sequential importer, which streams records from the parser to the
+database, the pipeline hands each package's records between stages as one
+list. Memory is therefore bounded by whole packages: up to
+parse_workers * 2 + queue_size + load_workers of them can be held at once.
+Lower parse_workers or queue_size, or use the sequential importer, where
+memory matters more than throughput.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from tga_importer import RECORD_TYPES, package_xml_files, parse_package, write_package_records
+
+# Marks the end of a queue's input
+_DONE = object()
+
+class PackagePipeline:
+    def __init__(self, get_connection, record_types=RECORD_TYPES, download_workers=4, parse_workers=None,
+                 load_workers=2, queue_size=8, batch_size=50, download_missing=True, xml_dir='xml',
+                 on_loaded=None):
+        """
+        get_connection: callable returning a database connection, e.g. db_pool.get_connection (one per load worker)
+        parse_workers: processes in the parse pool, defaults to the number of CPUs
+        queue_size: capacity of the queues between stages
+        download_missing: fetch XML for packages with no files in the XML store
+        on_loaded(tp_code, counts): called after each package is committed
+        """
+        self.get_connection = get_connection
+        self.record_types = tuple(record_types)
+        self.download_workers = max(1, download_workers)
+        self.parse_workers = max(1, parse_workers or os.cpu_count() or 1)
+        self.load_workers = max(1, load_workers)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = batch_size
+        self.download_missing = download_missing
+        self.xml_dir = xml_dir
+        self.on_loaded = on_loaded
+
+        self.stats_lock = threading.Lock()
+        self.stage_seconds = {'download': 0.0, 'parse': 0.0, 'load': 0.0}
+        self.loaded = []
+        self.failed = []
+
+    def _add_time(self, stage, seconds):
+        with self.stats_lock:
+            self.stage_seconds[stage] += seconds
+
+    def _fail(self, tp_code, stage, error):
+        print(f"{stage.capitalize()} failed for {tp_code}: {error}")
+        with self.stats_lock:
+            self.failed.append(tp_code)
+
+    def _download_worker(self, codes, parse_queue):
+        """Make sure each package's XML is in the store, then hand it to the parse stage"""
+        while True:
+            try:
+                tp_code = codes.get_nowait()
+            except queue.Empty:
+                return
+
+            started = time.perf_counter()
+            try:
+                if self.download_missing and not package_xml_files(tp_code, self.xml_dir):
+                    # Imported here so runs with everything on disk never load zeep
+                    from update_tps import download_xml_files
+                    download_xml_files(tp_code)
+                if not package_xml_files(tp_code, self.xml_dir):
+                    self._fail(tp_code, 'download', f"no XML files in the {self.xml_dir} store")
+                    continue
+            except Exception as e:
+                self._fail(tp_code, 'download', e)
+                continue
+            finally:
+                self._add_time('download', time.perf_counter() - started)
+
+            parse_queue.put(tp_code)
+
+    def _parse_dispatcher(self, parse_queue, load_queue):
+        """Feed the process pool, keeping at most parse_workers * 2 packages in flight"""
+        max_in_flight = self.parse_workers * 2
+        in_flight = {}
+
+        def collect(done):
+            for future in done:
+                tp_code, started = in_flight.pop(future)
+                self._add_time('parse', time.perf_counter() - started)
+                try:
+                    records = future.result()
+                except Exception as e:
+                    self._fail(tp_code, 'parse', e)
+                    continue
+                # Blocks while the load stage is behind
+                load_queue.put((tp_code, records))
+
+        # Spawned rather than forked: the download and load threads are already
+        # running, and a forked child could inherit a lock one of them holds
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=context) as executor:
+            while True:
+                tp_code = parse_queue.get()
+                if tp_code is _DONE:
+                    break
+                while len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                future = executor.submit(parse_package, tp_code, self.record_types, self.xml_dir)
+                in_flight[future] = (tp_code, time.perf_counter())
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        for _ in range(self.load_workers):
+            load_queue.put(_DONE)
+
+    def _load_worker(self, load_queue):
+        """Write parsed packages to the database, one commit per package"""
+        cnx = None
+        try:
+            cnx = self.get_connection()
+            while True:
+                item = load_queue.get()
+                if item is _DONE:
+                    return
+                tp_code, records = item
+
+                started = time.perf_counter()
+                try:
+                    counts = write_package_records(cnx, tp_code, records, self.record_types, self.batch_size)
+                except Exception as e:
+                    cnx.rollback()
+                    self._fail(tp_code, 'load', e)
+                    continue
+                finally:
+                    self._add_time('load', time.perf_counter() - started)
+
+                print(f"{tp_code}: loaded {sum(counts.values())} records")
+                with self.stats_lock:
+                    self.loaded.append(tp_code)
+                    if self.on_loaded:
+                        self.on_loaded(tp_code, counts)
+        except Exception as e:
+            print(f"Load worker stopped: {e}")
+            # Keep draining so upstream stages can finish
+            while True:
+                item = load_queue.get()
+                if item is _DONE:
+                    return
+                self._fail(item[0], 'load', e)
+        finally:
+            if cnx is not None:
+                cnx.close()
+
+    def run(self, tp_codes):
+        """
+        Process the given training packages through all three stages.
+        Returns a summary dict with loaded/failed packages, per-stage busy time and packages per minute.
+        """
+        started = time.perf_counter()
+
+        codes = queue.Queue()
+        for tp_code in tp_codes:
+            codes.put(tp_code)
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        load_queue = queue.Queue(maxsize=self.queue_size)
+
+        downloaders = [
+            threading.Thread(target=self._download_worker, args=(codes, parse_queue), daemon=True)
+            for _ in range(self.download_workers)
+        ]
+        dispatcher = threading.Thread(target=self._parse_dispatcher, args=(parse_queue, load_queue), daemon=True)
+        loaders = [
+            threading.Thread(target=self._load_worker, args=(load_queue,), daemon=True)
+            for _ in range(self.load_workers)
+        ]
+
+        for thread in downloaders + [dispatcher] + loaders:
+            thread.start()
+        for thread in downloaders:
+            thread.join()
+        parse_queue.put(_DONE)
+        dispatcher.join()
+        for thread in loaders:
+            thread.join()
+
+        elapsed = time.perf_counter() - started
+        per_minute = len(self.loaded) / elapsed * 60 if elapsed > 0 else 0
+        print(f"Pipeline loaded {len(self.loaded)} of {len(tp_codes)} packages in {elapsed:.1f}s "
+              f"({per_minute:.1f} packages/min)")
+        print("Stage busy time: " + ", ".join(
+            f"{stage} {seconds:.1f}s" for stage, seconds in self.stage_seconds.items()
+        ))
+
+        return {
+            'loaded': list(self.loaded),
+            'failed': list(self.failed),
+            'elapsed': elapsed,
+            'packages_per_minute': per_minute,
+            'stage_seconds': dict(self.stage_seconds)
+        }
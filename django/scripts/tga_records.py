@@ -0,0 +1,122 @@
+"""
+Compact records for the TGA sync
+Search and GetDetails responses are converted into these as soon as they
+arrive, so the sync compares plain values instead of probing zeep objects
+and the zeep graph for a page or response can be released straight away.
+Dates are normalised once, to timezone-naive datetimes.
+"""
+
+import os
+from collections import namedtuple
+from datetime import datetime
+
+def naive_datetime(value):
+    """
+    Convert a datetime, or a date string as stored in lol_tps.ReleaseDate,
+    to a timezone-naive datetime. Returns None if the value cannot be parsed.
+    """
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None) if value.tzinfo is not None else value
+    if not isinstance(value, str):
+        return None
+    try:
+        # Rows written by the sync are str(datetime), which this parses directly
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                parsed = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return None
+    return parsed.replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+def _offset_datetime(value):
+    """The DateTime of a DateTimeOffset structure, or the value itself if it is a plain date"""
+    return getattr(value, 'DateTime', value)
+
+class ComponentSummary:
+    """One TrainingComponentSummary from Search or SearchByModifiedDate"""
+    __slots__ = ('code', 'title', 'component_type', 'release_date')
+
+    def __init__(self, code, title, component_type, release_date):
+        self.code = code
+        self.title = title
+        self.component_type = component_type
+        self.release_date = release_date
+
+    @classmethod
+    def from_zeep(cls, summary):
+        """
+        Convert a zeep summary. release_date is UpdatedDate, or CreatedDate for
+        components never updated, and None if neither is present.
+        """
+        date = getattr(summary, 'UpdatedDate', None) or getattr(summary, 'CreatedDate', None)
+        component_type = getattr(summary, 'ComponentType', None)
+        if isinstance(component_type, list):
+            component_type = tuple(component_type)
+        return cls(
+            summary.Code,
+            summary.Title,
+            component_type,
+            naive_datetime(_offset_datetime(date)) if date else None
+        )
+
+    def __repr__(self):
+        return f"ComponentSummary({self.code!r}, {self.title!r}, {self.component_type!r}, {self.release_date!r})"
+
+# A lol_tps row, with ReleaseDate parsed
+ExistingPackage = namedtuple('ExistingPackage', 'title release_date processed xml_file')
+
+class XmlFileInfo(namedtuple('XmlFileInfo', 'xml_filename relative_path assessment_file')):
+    """The current release's main and assessment requirements XML files from GetDetails"""
+    __slots__ = ()
+
+    @classmethod
+    def from_details(cls, code, response, debug=False):
+        """
+        Pick the current release's XML files out of a GetDetails response.
+        The main file is the shortest XML path, which skips header and credit files.
+        Returns None if there is no current release or it has no XML file.
+        """
+        releases = getattr(response, 'Releases', None)
+        releases = getattr(releases, 'Release', None) if releases else None
+        if not releases:
+            if debug:
+                print(f"No releases found for {code}")
+            return None
+
+        if isinstance(releases, list):
+            target = next((release for release in releases if getattr(release, 'Currency', None) == 'Current'), None)
+        else:
+            # Only one release
+            target = releases
+        if target is None:
+            if debug:
+                print(f"No current release found for {code}")
+            return None
+
+        files = getattr(getattr(target, 'Files', None), 'ReleaseFile', None) or []
+        if not isinstance(files, list):
+            files = [files]
+
+        main_file = ""
+        assessment_file = ""
+        for file_obj in files:
+            relative_path = getattr(file_obj, 'RelativePath', None)
+            if not relative_path or '.xml' not in relative_path:
+                continue
+            relative_path = relative_path.replace('\\', '/')
+            if 'AssessmentRequirements' in relative_path:
+                assessment_file = relative_path
+            if not main_file or len(relative_path) < len(main_file):
+                main_file = relative_path
+
+        if not main_file:
+            if debug:
+                print(f"No XML file found for {code}")
+            return None
+        if debug:
+            print(f"XML files for {code}: {main_file} {assessment_file}")
+        return cls(os.path.basename(main_file), main_file, assessment_file)
@@ -1,358 +1,580 @@
 import requests
 from requests.auth import HTTPBasicAuth
 from requests import Session
+from requests.adapters import HTTPAdapter
 from zeep import Client, Settings
+from zeep.cache import SqliteCache
 from zeep.transports import Transport
 from zeep.wsse.username import UsernameToken
 import mysql.connector
 from mysql.connector import errorcode
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-import urllib.request
-import urllib.error
+import threading
 from dotenv import load_dotenv
+from xml_manifest import XmlManifest
+from xml_store import XmlStore
+from db_pool import get_connection
+from sync_metrics import metrics
+from tga_records import ComponentSummary, ExistingPackage, XmlFileInfo, naive_datetime
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Define the base URL for the sandbox environment
+# (TGA_WSDL_URL/TGA_XML_BASE_URL can point at a local stand-in for testing)
 base_url = "https://ws.sandbox.training.gov.au/Deewr.Tga.Webservices/"
-wsdl_url = f"{base_url}TrainingComponentServiceV12.svc?wsdl"
-xml_base_url = "https://training.gov.au/TrainingComponentFiles/"
+wsdl_url = os.getenv('TGA_WSDL_URL', f"{base_url}TrainingComponentServiceV12.svc?wsdl")
+xml_base_url = os.getenv('TGA_XML_BASE_URL', "https://training.gov.au/TrainingComponentFiles/")
 
 # Define the login details
 username = "WebService.Read"
 password = "Asdf098"
 
-# Create a session with basic authentication
-session = Session()
-session.auth = HTTPBasicAuth(username, password)
-transport = Transport(session=session)
+# Local cache for the WSDL and XSD documents so repeated runs don't download them again
+wsdl_cache_path = os.getenv('TGA_WSDL_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wsdl_cache.db'))
+wsdl_cache_ttl = int(os.getenv('TGA_WSDL_CACHE_TTL', str(7 * 24 * 60 * 60)))  # seconds
 
-# Create a SOAP client with WSSE authentication
-settings = Settings(strict=False, xml_huge_tree=True)
-client = Client(wsdl=wsdl_url, transport=transport, wsse=UsernameToken(username, password), settings=settings)
+# The SOAP client is created on first use by get_client()
+_client = None
+_client_lock = threading.Lock()
 
-def remote_file_exists(url):
-    """Check if a remote file exists"""
-    try:
-        response = urllib.request.urlopen(urllib.request.Request(url, method='HEAD'))
-        return response.status == 200
-    except (urllib.error.HTTPError, urllib.error.URLError):
-        return False
+def get_client():
+    """
+    Return the shared SOAP client, creating it on first use.
+    Building the client fetches and parses the WSDL, so callers that never talk
+    to TGA (e.g. admin_update_manager.py status) don't pay for it.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Create a session with basic authentication
+                session = Session()
+                session.auth = HTTPBasicAuth(username, password)
+                cache = SqliteCache(path=wsdl_cache_path, timeout=wsdl_cache_ttl)
+                transport = Transport(session=session, cache=cache)
+                
+                # Create a SOAP client with WSSE authentication
+                settings = Settings(strict=False, xml_huge_tree=True)
+                _client = Client(wsdl=wsdl_url, transport=transport, wsse=UsernameToken(username, password), settings=settings)
+    return _client
+
+# Number of packages downloaded in parallel by download_xml_files_concurrent
+default_max_workers = 8
+
+# Shared keep-alive session for XML file downloads (the files are public, no auth needed)
+http_session = Session()
+http_session.mount('https://', HTTPAdapter(pool_maxsize=default_max_workers))
+http_session.mount('http://', HTTPAdapter(pool_maxsize=default_max_workers))
+
+# Manifest of downloaded XML files (ETag, Last-Modified, size, hash) keyed by RelativePath
+manifest = XmlManifest(os.path.join('xml', 'manifest.json'))
+
+# Compressed, content-addressed copies of the downloaded files, indexed by tpCode and filename
+store = XmlStore('xml')
+
+# RelativePaths fetched during this run, with a lock per path so the same file
+# is never requested twice, even when packages share it
+_fetched_paths = set()
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+def reset_run_state():
+    """
+    Start a new run: forget which RelativePaths have been fetched, so the next
+    request for each goes back to TGA. A process that runs more than one sync
+    (a Celery worker) calls this at the start of each.
+    """
+    with _path_locks_guard:
+        _fetched_paths.clear()
+        _path_locks.clear()
+
+def _path_lock(relative_path):
+    """Return the lock serialising downloads of one RelativePath"""
+    with _path_locks_guard:
+        return _path_locks.setdefault(relative_path, threading.Lock())
+
+def details_request(code):
+    """Build the GetDetails request for a training component (same options as the PHP version)"""
+    return {
+        "Code": code,
+        "InformationRequest": {
+            "ShowReleases": True,
+            "ShowUnitGrid": True,
+            "ShowFiles": True
+        },
+        "IncludeLegacyData": False
+    }
+
+def extract_xml_file_info(code, response, debug=False):
+    """
+    Pick the current release's XML files out of a GetDetails response
+    Returns XmlFileInfo: (xml_filename, relative_path, assessment_requirements_file) or None
+    """
+    return XmlFileInfo.from_details(code, response, debug)
 
 def get_xml_file_info(code, debug=False):
     """
     Get XML file information for a given training package code
-    Returns tuple: (xml_filename, relative_path, assessment_requirements_file)
+    Returns XmlFileInfo: (xml_filename, relative_path, assessment_requirements_file) or None
     """
     if debug:
         print(f"Getting XML for {code}")
     
     try:
-        # Create request objects similar to PHP version
-        payload = {
-            "Code": code,
-            "InformationRequest": {
-                "ShowReleases": True,
-                "ShowUnitGrid": True,
-                "ShowFiles": True
-            },
-            "IncludeLegacyData": False
-        }
-        
         # Get details for the training component
-        response = client.service.GetDetails(request=payload)
-        
-        if not hasattr(response, 'Releases') or not response.Releases:
-            if debug:
-                print(f"No releases found for {code}")
-            return None
+        with metrics.timer('get_details'):
+            response = get_client().service.GetDetails(request=details_request(code))
+        return extract_xml_file_info(code, response, debug)
             
-        # Find current release
-        target = None
-        releases = response.Releases.Release
+    except Exception as e:
+        print(f"Error getting XML info for {code}: {e}")
+        return None
+
+def download_file(relative_path, tp_code, debug=False):
+    """
+    Download a TGA XML file into the XML store with a single conditional GET.
+    Sends If-None-Match/If-Modified-Since from the manifest and streams the body
+    straight into a compressed store object, so readers never see a partial file.
+    The file is indexed as tp_code/<filename of relative_path>.
+    Returns one of 'downloaded', 'unchanged', 'missing' or 'failed'
+    """
+    url = xml_base_url + relative_path
+    filename = os.path.basename(relative_path)
+    
+    with metrics.timer('download'):
+        status = _download_file(url, relative_path, filename, tp_code, debug)
+    metrics.add_outcome('download', status)
+    if status == 'failed':
+        metrics.add_error('download')
+    return status
+
+def _download_file(url, relative_path, filename, tp_code, debug):
+    """download_file() without the metrics"""
+    with _path_lock(relative_path):
+        entry = manifest.get(relative_path)
+        if relative_path in _fetched_paths and entry:
+            # Already fetched this run, possibly for another package
+            if not store.lookup(tp_code, filename):
+                store.add(tp_code, filename, entry['sha256'], entry['size'])
+            return 'unchanged'
         
-        if isinstance(releases, list):
-            for release in releases:
-                if hasattr(release, 'Currency') and release.Currency == 'Current':
-                    target = release
-                    break
-        else:
-            # Only one release
-            target = releases
-            
-        if not target:
+        try:
+            have_copy = store.lookup(tp_code, filename) is not None
+            headers = manifest.conditional_headers(relative_path, have_copy)
             if debug:
-                print(f"No current release found for {code}")
-            return None
-            
-        if debug:
-            print(f"Found target release for {code}")
+                print(f"Downloading {url} into the XML store as {tp_code}/{filename} (conditional: {bool(headers)})")
             
-        # Find the shortest XML file (ignoring header and credit files)
-        target_file = ""
-        assessment_requirements_file = ""
-        
-        if hasattr(target, 'Files') and hasattr(target.Files, 'ReleaseFile'):
-            release_files = target.Files.ReleaseFile
-            if not isinstance(release_files, list):
-                release_files = [release_files]
+            with http_session.get(url, headers=headers, stream=True, timeout=60) as response:
+                if response.status_code == 304:
+                    manifest.touch(relative_path)
+                    _fetched_paths.add(relative_path)
+                    return 'unchanged'
+                if response.status_code == 404:
+                    print(f"XML file does not exist at {url}")
+                    return 'missing'
+                response.raise_for_status()
                 
-            for file_obj in release_files:
-                if hasattr(file_obj, 'RelativePath') and '.xml' in file_obj.RelativePath:
-                    relative_path = file_obj.RelativePath.replace('\\', '/')
-                    
-                    # Look for assessment requirements file
-                    if 'AssessmentRequirements' in relative_path:
-                        assessment_requirements_file = relative_path
-                        if debug:
-                            print(f"Found assessment requirements file: {assessment_requirements_file}")
-                    
-                    # Find shortest XML file (main file)
-                    if not target_file or len(relative_path) < len(target_file):
-                        target_file = relative_path
-                        if debug:
-                            print(f"New target file: {target_file}")
-        
-        if target_file and '.xml' in target_file:
-            return (os.path.basename(target_file), target_file, assessment_requirements_file)
-        else:
-            if debug:
-                print(f"No XML file found for {code}")
-            return None
+                pending = store.begin_write()
+                try:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        pending.write(chunk)
+                except Exception:
+                    pending.discard()
+                    raise
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
             
-    except Exception as e:
-        print(f"Error getting XML info for {code}: {e}")
-        return None
+            # Servers without validators still send the full file; identical
+            # bytes hash to the object we already have
+            sha256 = pending.commit()
+            metrics.add_bytes('download', pending.size)
+            previous = store.lookup(tp_code, filename)
+            status = 'unchanged' if previous and previous['sha256'] == sha256 else 'downloaded'
+            store.add(tp_code, filename, sha256, pending.size)
+            
+            manifest.record(relative_path, f"{tp_code}/{filename}", etag, last_modified, pending.size, sha256)
+            _fetched_paths.add(relative_path)
+            return status
+        except Exception as e:
+            print(f"Error downloading {url}: {e}")
+            return 'failed'
 
-def download_file(url, local_path, debug=False):
-    """Download a file from URL to local path"""
-    try:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
-        
-        if debug:
-            print(f"Downloading {url} to {local_path}")
-        
-        # Download the file
-        urllib.request.urlretrieve(url, local_path)
-        return True
-    except Exception as e:
-        print(f"Error downloading {url}: {e}")
-        return False
+def _file_result(tp_code, kind, url, store_key, status):
+    """Build the per-file result reported by the download functions"""
+    return {
+        'tp_code': tp_code,
+        'kind': kind,
+        'url': url,
+        'store_key': store_key,
+        'status': status
+    }
 
-def download_xml_files(tp_code, debug=False):
+def download_package_files(tp_code, debug=False, xml_infos=None):
     """
-    Download XML files for a training package
-    Returns the main XML filename if successful, None otherwise
+    Download the main and assessment requirements XML files for a training package
+    xml_infos optionally maps codes to already fetched get_xml_file_info() results;
+    codes missing from it are looked up with GetDetails as usual.
+    Returns tuple: (xml_filename, file_results) where xml_filename is None if the
+    main file could not be downloaded and file_results holds one dict per file
     """
-    xml_info = get_xml_file_info(tp_code, debug)
+    if xml_infos is not None and tp_code in xml_infos:
+        xml_info = xml_infos[tp_code]
+    else:
+        xml_info = get_xml_file_info(tp_code, debug)
     
     if not xml_info:
         if debug:
             print(f"Could not get XML info for {tp_code}")
-        return None
+        return None, [_file_result(tp_code, 'main', None, None, 'no_info')]
         
     xml_filename, relative_path, assessment_file = xml_info
-    
-    # Create local directory structure
-    local_dir = f"xml/{tp_code}"
-    os.makedirs(local_dir, exist_ok=True)
+    file_results = []
     
     # Download main XML file
     xml_url = xml_base_url + relative_path
-    local_xml_path = os.path.join(local_dir, xml_filename)
+    current_files = [xml_filename]
     
-    if remote_file_exists(xml_url):
-        if download_file(xml_url, local_xml_path, debug):
-            print(f"Downloaded main XML file for {tp_code}: {xml_filename}")
-            
-            # Download assessment requirements file if it exists
-            if assessment_file:
-                assessment_url = xml_base_url + assessment_file
-                assessment_filename = os.path.basename(assessment_file)
-                local_assessment_path = os.path.join(local_dir, assessment_filename)
-                
-                if remote_file_exists(assessment_url):
-                    if download_file(assessment_url, local_assessment_path, debug):
-                        print(f"Downloaded assessment file for {tp_code}: {assessment_filename}")
-                    else:
-                        print(f"Failed to download assessment file for {tp_code}: {assessment_filename}")
-            
-            return xml_filename
-        else:
-            print(f"Failed to download main XML file for {tp_code}")
-            return None
+    status = download_file(relative_path, tp_code, debug)
+    file_results.append(_file_result(tp_code, 'main', xml_url, f"{tp_code}/{xml_filename}", status))
+    if status == 'downloaded':
+        print(f"Downloaded main XML file for {tp_code}: {xml_filename}")
+    elif status == 'unchanged':
+        print(f"Main XML file unchanged for {tp_code}: {xml_filename}")
     else:
-        print(f"XML file does not exist at {xml_url}")
-        return None
+        print(f"Failed to download main XML file for {tp_code}")
+        return None, file_results
+    
+    # Download assessment requirements file if it exists
+    if assessment_file:
+        assessment_url = xml_base_url + assessment_file
+        assessment_filename = os.path.basename(assessment_file)
+        current_files.append(assessment_filename)
+        
+        status = download_file(assessment_file, tp_code, debug)
+        if status == 'downloaded':
+            print(f"Downloaded assessment file for {tp_code}: {assessment_filename}")
+        elif status == 'failed':
+            print(f"Failed to download assessment file for {tp_code}: {assessment_filename}")
+        file_results.append(_file_result(tp_code, 'assessment', assessment_url, f"{tp_code}/{assessment_filename}", status))
+    
+    # Files from earlier releases are no longer part of the package
+    store.retain(tp_code, current_files)
+    return xml_filename, file_results
+
+def download_xml_files(tp_code, debug=False):
+    """
+    Download XML files for a training package
+    Returns the main XML filename if successful, None otherwise
+    """
+    xml_filename, _ = download_package_files(tp_code, debug)
+    manifest.save()
+    store.save_index()
+    return xml_filename
 
-def get_current_training_packages():
+def download_xml_files_concurrent(tp_codes, max_workers=default_max_workers, debug=False, xml_infos=None):
     """
-    Retrieve a list of all current training packages using the TrainingComponentService.
-    This function sends a request to the TrainingComponentService to search for all current
-    training packages and returns the results.
-    Returns:
-    list: A list of current training packages.
+    Download XML files for many training packages using a bounded worker pool.
+    All workers share the keep-alive http_session, so at most max_workers
+    packages are in flight at once.
+    Yields tuple: (tp_code, xml_filename, file_results) as each package completes
+    """
+    if not tp_codes:
+        return
+    
+    # Size the connection pool to the number of workers so connections are reused
+    adapter = HTTPAdapter(pool_maxsize=max_workers)
+    http_session.mount('https://', adapter)
+    http_session.mount('http://', adapter)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(download_package_files, tp_code, debug, xml_infos): tp_code
+                for tp_code in tp_codes
+            }
+            for future in as_completed(futures):
+                tp_code = futures[future]
+                try:
+                    xml_filename, file_results = future.result()
+                except Exception as e:
+                    print(f"Error downloading XML files for {tp_code}: {e}")
+                    xml_filename = None
+                    file_results = [_file_result(tp_code, 'main', None, None, 'failed')]
+                yield tp_code, xml_filename, file_results
+    finally:
+        manifest.save()
+        store.save_index()
+
+# Component types that can be switched on in a search's TrainingComponentTypes
+COMPONENT_TYPES = (
+    "TrainingPackage", "Qualification", "SkillSet", "Unit",
+    "AccreditedCourse", "AccreditedCourseModule", "UnitContextualisation"
+)
+
+# Summaries requested per search page; only one page is held in memory at a time
+search_page_size = int(os.getenv('TGA_SEARCH_PAGE_SIZE', '500'))
+
+def component_types(*types):
+    """TrainingComponentTypes flags with only the given component types included"""
+    unknown = set(types) - set(COMPONENT_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown component types: {', '.join(sorted(unknown))}")
+    return {f"Include{component_type}": component_type in types for component_type in COMPONENT_TYPES}
+
+# Component types requested by the training package searches below
+training_package_types = component_types("TrainingPackage")
+
+def summary_records(response):
+    """ComponentSummary records for the TrainingComponentSummary objects in a search response"""
+    results = getattr(response, 'Results', None)
+    summaries = (results.TrainingComponentSummary if results else None) or []
+    return [ComponentSummary.from_zeep(summary) for summary in summaries]
+
+def _search_pages(operation, payload, page_size):
+    """
+    Call a paged search operation one page at a time (PageNumber from 1),
+    yielding a ComponentSummary for each TrainingComponentSummary. Each
+    page's zeep objects are released once converted. Stops at a short page or once Count results are seen.
+    """
+    page_number = 1
+    while True:
+        with metrics.timer('search'):
+            response = operation(request=dict(payload, PageNumber=page_number, PageSize=page_size))
+        summaries = summary_records(response)
+        count = getattr(response, 'Count', None)
+        # Only the compact records are kept while the page is consumed
+        del response
+        metrics.add_rows('search', len(summaries))
+        
+        yield from summaries
+        if len(summaries) < page_size or (count is not None and page_number * page_size >= count):
+            return
+        page_number += 1
+
+def search_components(types=training_package_types, page_size=None, filter_text=""):
+    """
+    Search for current components of the given types (flags from component_types()).
+    A generator of ComponentSummary records: pages are requested as the
+    summaries are consumed, and errors are raised from the iteration.
     """
     payload = {
-        "Filter": "",
+        "Filter": filter_text,
         "IncludeDeleted": False,
         "IncludeSuperseded": False,
         "SearchCode": False,
         "SearchIndustrySector": False,
         "SearchOccupation": False,
         "SearchTitle": True,
-        "TrainingComponentTypes": {
-            "IncludeTrainingPackage": True,
-            "IncludeQualification": False,
-            "IncludeSkillSet": False,
-            "IncludeUnit": False,
-            "IncludeAccreditedCourse": False,
-            "IncludeAccreditedCourseModule": False,
-            "IncludeUnitContextualisation": False
-        }
+        "TrainingComponentTypes": types
     }
-    try:
-        response = client.service.Search(request=payload)
-        return response
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+    yield from _search_pages(get_client().service.Search, payload, page_size or search_page_size)
+
+def search_components_modified(since, until=None, types=training_package_types, page_size=None):
+    """Like search_components(), for components modified between since and until (default now)"""
+    payload = {
+        "StartDate": _date_time_offset(since),
+        "EndDate": _date_time_offset(until or datetime.now()),
+        "TrainingComponentTypes": types
+    }
+    yield from _search_pages(get_client().service.SearchByModifiedDate, payload, page_size or search_page_size)
+
+def get_current_training_packages(page_size=None):
+    """
+    Retrieve all current training packages using the TrainingComponentService.
+    Returns a generator of ComponentSummary records, fetched a page at a time
+    as upsert_training_packages_to_db() consumes them.
+    """
+    return search_components(training_package_types, page_size)
+
+def _date_time_offset(value):
+    """Convert a naive local datetime to the service's DateTimeOffset structure"""
+    offset = value.astimezone().utcoffset()
+    return {
+        "DateTime": value,
+        "OffsetMinutes": int(offset.total_seconds() // 60) if offset else 0
+    }
+
+def get_modified_training_packages(since, until=None, page_size=None):
+    """
+    Retrieve only the training packages modified between since and until (default now)
+    using the TrainingComponentService SearchByModifiedDate operation.
+    Returns a generator like get_current_training_packages().
+    """
+    return search_components_modified(since, until, training_package_types, page_size)
+
+def parse_release_date(value):
+    """
+    Convert a ReleaseDate from lol_tps (stored as varchar) or from the web service
+    into a timezone-naive datetime. Returns None if the value cannot be parsed.
+    """
+    return naive_datetime(value)
+
+def load_existing_training_packages(cursor):
+    """
+    Load every lol_tps row in a single query.
+    Returns dict: tpCode -> ExistingPackage(title, release_date as naive datetime, processed, xml_file)
+    """
+    cursor.execute("SELECT tpCode, tpTitle, ReleaseDate, processed, xmlFile FROM lol_tps")
+    existing = {}
+    for (code, title, release_date, processed, xmlfile) in cursor:
+        parsed_date = parse_release_date(release_date)
+        if parsed_date is None:
+            print(f"Warning: Could not parse existing date {release_date} for {code}")
+            parsed_date = datetime.min  # Set to very old date to force update
+        existing[code] = ExistingPackage(title, parsed_date, processed, xmlfile)
+    return existing
+
+# Batched upsert keyed on the unique tpCode index
+upsert_query = (
+    "INSERT INTO lol_tps (tpCode, tpTitle, ReleaseDate, xmlFile, processed) "
+    "VALUES (%s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE tpTitle = VALUES(tpTitle), ReleaseDate = VALUES(ReleaseDate), "
+    "xmlFile = VALUES(xmlFile), processed = VALUES(processed)"
+)
+
+def write_training_package_rows(cursor, rows):
+    """Write a batch of (tpCode, tpTitle, ReleaseDate, xmlFile, processed) rows in one statement"""
+    if rows:
+        with metrics.timer('db_write'):
+            cursor.executemany(upsert_query, rows)
+        metrics.add_rows('db_write', len(rows))
+
+def commit_batch(cnx):
+    """Commit written rows, timed as its own phase"""
+    with metrics.timer('db_commit'):
+        cnx.commit()
+
+def write_and_commit(cnx, cursor, rows):
+    """
+    Write a batch of rows and commit it, so an interrupted run keeps what it
+    has written. Returns the number of rows written.
+    """
+    write_training_package_rows(cursor, rows)
+    commit_batch(cnx)
+    return len(rows)
 
-def upsert_training_packages_to_db(training_packages_response, debug=False):
+def upsert_training_packages_to_db(training_packages_response, debug=False, max_workers=default_max_workers, batch_size=50,
+                                   metadata_options=None):
     """
     Upsert training packages to the lol_tps table in the learnonline database.
+    training_packages_response is any iterable of ComponentSummary records, such
+    as the generator from get_current_training_packages(); it is consumed once,
+    so search pages are fetched while earlier ones are compared. A whole
+    Search response is also accepted.
     If the ReleaseDate is later in the retrieved xml than the data in the table,
     set the processed flag to 'N' and download fresh XML files.
+    Existing rows are loaded in one query and compared in memory; only new or
+    changed rows are written, batch_size rows per INSERT ... ON DUPLICATE KEY UPDATE,
+    and each batch is committed as it is written. Rerunning after an interruption
+    skips the rows already committed, since they now compare as unchanged.
+    XML downloads run concurrently (up to max_workers packages at a time) and
+    each row is queued for writing as soon as its download completes.
+    If metadata_options is a dict (keyword arguments for
+    tga_async.fetch_xml_file_infos), GetDetails for every changed package is
+    fetched up front on the async client instead of once per download worker.
+    Returns True once all changes are committed, False if the sync failed.
     """
-    # Extract the actual training packages from the response
-    if not training_packages_response or not hasattr(training_packages_response, 'Results'):
+    if training_packages_response is None:
         print("No training packages found in response")
-        return
+        return False
     
-    training_packages = training_packages_response.Results.TrainingComponentSummary
+    if hasattr(training_packages_response, 'Results'):
+        # An incremental search with no changes returns no results at all
+        training_packages = summary_records(training_packages_response)
+        metrics.add_rows('search', len(training_packages))
+    else:
+        training_packages = training_packages_response
     
+    cnx = None
     try:
-        # Load database configuration from environment variables
-        cnx = mysql.connector.connect(
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            host=os.getenv('DB_HOST', '127.0.0.1'),
-            database=os.getenv('DB_NAME'),
-            port=int(os.getenv('DB_PORT', '3306'))
-        )
+        # Borrowed from the shared pool (db_pool.py), configured from environment variables
+        cnx = get_connection()
         cursor = cnx.cursor()
+        
+        with metrics.timer('db_read'):
+            existing_packages = load_existing_training_packages(cursor)
+        metrics.add_rows('db_read', len(existing_packages))
+        
+        # tpCode -> (tpTitle, ReleaseDate) for packages needing XML
+        pending_downloads = {}
+        pending_rows = []
+        written = 0
+        unchanged = 0
+        seen = 0
 
         for package in training_packages:
-            # Access attributes using dot notation for Zeep objects
-            tpCode = package.Code
-            tpTitle = package.Title
+            seen += 1
+            if not isinstance(package, ComponentSummary):
+                package = ComponentSummary.from_zeep(package)
+            tpCode = package.code
+            tpTitle = package.title
             
-            # Extract the datetime from the UpdatedDate structure
-            # Use hasattr to check if attributes exist
-            if hasattr(package, 'UpdatedDate') and package.UpdatedDate:
-                if hasattr(package.UpdatedDate, 'DateTime'):
-                    ReleaseDate = package.UpdatedDate.DateTime
-                else:
-                    ReleaseDate = package.UpdatedDate
-            elif hasattr(package, 'CreatedDate') and package.CreatedDate:
-                if hasattr(package.CreatedDate, 'DateTime'):
-                    ReleaseDate = package.CreatedDate.DateTime
-                else:
-                    ReleaseDate = package.CreatedDate
-            else:
+            # UpdatedDate (or CreatedDate), already timezone-naive
+            ReleaseDate = package.release_date
+            if ReleaseDate is None:
                 print(f"Warning: No date found for package {tpCode}")
                 continue
+            
+            existing = existing_packages.get(tpCode)
+            if existing is None:
+                # New training package - download XML
+                print(f"New training package found: {tpCode} - will download XML")
+                pending_downloads[tpCode] = (tpTitle, ReleaseDate)
+                continue
+            
+            existing_title, existing_release_date, existing_processed, existing_xmlfile = existing
+            
+            # Compare dates - if new date is later, mark as unprocessed and download XML
+            if ReleaseDate > existing_release_date:
+                print(f"Fresher copy found for {tpCode} - will download XML")
+                pending_downloads[tpCode] = (tpTitle, ReleaseDate)
+            elif tpTitle != existing_title:
+                # Keep existing xmlfile and processed flag, only the title changed
+                pending_rows.append((tpCode, tpTitle, existing_release_date, existing_xmlfile, existing_processed))
+                print(f"Updated: {tpCode} - {tpTitle}")
+            else:
+                unchanged += 1
+                if debug:
+                    print(f"Unchanged: {tpCode} - {tpTitle}")
+            
+            if len(pending_rows) >= batch_size:
+                written += write_and_commit(cnx, cursor, pending_rows)
+                pending_rows = []
 
-            # Check if record exists and handle accordingly
-            query = ("SELECT tpID, ReleaseDate, processed, xmlFile FROM lol_tps WHERE tpCode = %s")
-            cursor.execute(query, (tpCode,))
-            result = cursor.fetchone()
-
-            should_download_xml = False
-            xmlfile = None
+        xml_infos = None
+        if metadata_options is not None and pending_downloads:
+            # Imported here because the async client needs the optional httpx dependency
+            from tga_async import get_xml_file_infos
+            xml_infos = get_xml_file_infos(list(pending_downloads), debug=debug, **metadata_options)
 
-            if result:
-                existing_tpID = result[0]
-                existing_release_date = result[1]
-                existing_processed = result[2]
-                existing_xmlfile = result[3]
-                
-                # Convert existing_release_date to datetime if it's a string
-                if isinstance(existing_release_date, str):
-                    try:
-                        # Try to parse the string as a datetime
-                        existing_release_date = datetime.fromisoformat(existing_release_date.replace('Z', '+00:00'))
-                    except ValueError:
-                        try:
-                            # Try alternative parsing formats
-                            existing_release_date = datetime.strptime(existing_release_date, '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            print(f"Warning: Could not parse existing date {existing_release_date} for {tpCode}")
-                            existing_release_date = datetime.min  # Set to very old date to force update
-                
-                # Compare dates - if new date is later, mark as unprocessed and download XML
-                # Make sure ReleaseDate is timezone-naive for comparison if needed
-                release_date_for_comparison = ReleaseDate
-                if hasattr(ReleaseDate, 'replace') and ReleaseDate.tzinfo is not None:
-                    release_date_for_comparison = ReleaseDate.replace(tzinfo=None)
-                
-                if hasattr(existing_release_date, 'tzinfo') and existing_release_date.tzinfo is not None:
-                    existing_release_date = existing_release_date.replace(tzinfo=None)
-                
-                if release_date_for_comparison > existing_release_date:
-                    processed = 'N'
-                    should_download_xml = True
-                    print(f"Fresher copy found for {tpCode} - will download XML")
-                else:
-                    processed = existing_processed
-                    xmlfile = existing_xmlfile  # Keep existing xmlfile
-                
-                # Download XML if needed
-                if should_download_xml:
-                    downloaded_xmlfile = download_xml_files(tpCode, debug)
-                    if downloaded_xmlfile:
-                        xmlfile = downloaded_xmlfile
-                    else:
-                        xmlfile = f"{tpCode}.xml"  # Fallback
-                
-                # Update existing record
-                update_query = (
-                    "UPDATE lol_tps SET tpTitle = %s, ReleaseDate = %s, xmlFile = %s, processed = %s "
-                    "WHERE tpID = %s"
-                )
-                cursor.execute(update_query, (tpTitle, ReleaseDate, xmlfile, processed, existing_tpID))
-                
-                if should_download_xml:
-                    print(f"Updated with fresh XML: {tpCode} - {tpTitle}")
-                else:
-                    print(f"Updated: {tpCode} - {tpTitle}")
+        # Download XML for new and fresher packages in parallel, queueing rows as results arrive
+        downloads = download_xml_files_concurrent(list(pending_downloads), max_workers, debug, xml_infos)
+        for tpCode, downloaded_xmlfile, file_results in downloads:
+            tpTitle, ReleaseDate = pending_downloads[tpCode]
+            xmlfile = downloaded_xmlfile or f"{tpCode}.xml"  # Fallback
+            
+            if debug:
+                for file_result in file_results:
+                    print(f"  {file_result['kind']} file for {tpCode}: {file_result['status']}")
+            
+            pending_rows.append((tpCode, tpTitle, ReleaseDate, xmlfile, 'N'))
+            if tpCode in existing_packages:
+                print(f"Updated with fresh XML: {tpCode} - {tpTitle}")
             else:
-                # New training package - download XML
-                processed = 'N'
-                should_download_xml = True
-                print(f"New training package found: {tpCode} - will download XML")
-                
-                downloaded_xmlfile = download_xml_files(tpCode, debug)
-                if downloaded_xmlfile:
-                    xmlfile = downloaded_xmlfile
-                else:
-                    xmlfile = f"{tpCode}.xml"  # Fallback
-                
-                # Insert new record
-                insert_query = (
-                    "INSERT INTO lol_tps (tpCode, tpTitle, ReleaseDate, xmlFile, processed) "
-                    "VALUES (%s, %s, %s, %s, %s)"
-                )
-                cursor.execute(insert_query, (tpCode, tpTitle, ReleaseDate, xmlfile, processed))
                 print(f"Inserted new: {tpCode} - {tpTitle}")
-
-        cnx.commit()
+            
+            if len(pending_rows) >= batch_size:
+                written += write_and_commit(cnx, cursor, pending_rows)
+                pending_rows = []
+        
+        written += write_and_commit(cnx, cursor, pending_rows)
         cursor.close()
-        cnx.close()
-        print(f"Successfully processed {len(training_packages)} training packages")
+        print(f"Wrote {written} changed training packages, {unchanged} unchanged")
+        print(f"Successfully processed {seen} training packages")
+        return True
         
     except mysql.connector.Error as err:
         if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
@@ -365,7 +587,7 @@ def upsert_training_packages_to_db(training_packages_response, debug=False):
         print(f"An unexpected error occurred: {e}")
         # Add debugging information
         print(f"Type of training_packages_response: {type(training_packages_response)}")
-        if hasattr(training_packages_response, 'Results'):
+        if hasattr(training_packages_response, 'Results') and training_packages_response.Results:
             print(f"Type of Results: {type(training_packages_response.Results)}")
             if hasattr(training_packages_response.Results, 'TrainingComponentSummary'):
                 print(f"Type of TrainingComponentSummary: {type(training_packages_response.Results.TrainingComponentSummary)}")
@@ -374,17 +596,16 @@ def upsert_training_packages_to_db(training_packages_response, debug=False):
                     print(f"Type of first package: {type(first_package)}")
                     print(f"Available attributes: {dir(first_package)}")
     finally:
-        if 'cnx' in locals() and cnx.is_connected():
+        if cnx is not None:
+            # Returns the connection to the pool
             cnx.close()
+    return False
 
 if __name__ == "__main__":
     # Set debug to True for verbose output
     debug_mode = False
     
     print("Starting training package update process with XML download...")
-    training_packages = get_current_training_packages()
-    if training_packages:
-        upsert_training_packages_to_db(training_packages, debug=debug_mode)
-    else:
-        print("Failed to retrieve training packages")
+    if not upsert_training_packages_to_db(get_current_training_packages(), debug=debug_mode):
+        print("Failed to update training packages")
     print("Process completed.")
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Manifest of downloaded training.gov.au XML files
+Records the ETag, Last-Modified, size and content hash of each file by its
+RelativePath so later runs can send conditional requests and skip unchanged files.
+"""
+
+import json
+import threading
+from datetime import datetime
+
+from atomic_file import write_json_atomic
+
+class XmlManifest:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it doesn't exist"""
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except ValueError:
+            print(f"Warning: Could not read XML manifest {self.path}, starting a new one")
+            self.entries = {}
+
+    def save(self):
+        """Write the manifest atomically (temp file then rename)"""
+        with self.lock:
+            write_json_atomic(self.path, self.entries, sort_keys=True)
+
+    def get(self, relative_path):
+        """Return the manifest entry for a RelativePath, or None"""
+        with self.lock:
+            return self.entries.get(relative_path)
+
+    def conditional_headers(self, relative_path, have_copy):
+        """
+        Build If-None-Match/If-Modified-Since headers for a file.
+        Only used when the XML store still has a copy, otherwise a 304 would leave us without a file.
+        """
+        entry = self.get(relative_path)
+        if not entry or not have_copy:
+            return {}
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record(self, relative_path, store_key, etag, last_modified, size, sha256):
+        """Record the validators and content hash of a downloaded file"""
+        with self.lock:
+            self.entries[relative_path] = {
+                'store_key': store_key,
+                'etag': etag,
+                'last_modified': last_modified,
+                'size': size,
+                'sha256': sha256,
+                'checked': datetime.now().isoformat()
+            }
+
+    def touch(self, relative_path):
+        """Mark an entry as confirmed unchanged by the server"""
+        with self.lock:
+            if relative_path in self.entries:
+                self.entries[relative_path]['checked'] = datetime.now().isoformat()
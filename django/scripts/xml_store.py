@@ -0,0 +1,204 @@
+"""
+Content-addressed store for downloaded training.gov.au XML
+Each file is gzip-compressed and saved once under xml/objects/ by the SHA-256
+of its uncompressed bytes, so identical files across releases and packages
+share one copy. xml/index.json maps "tp_code/filename" keys to hashes.
+Readers get a streaming file object over a memory-mapped compressed file.
+
+Usage: python xml_store.py [migrate|prune]
+"""
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import sys
+import tempfile
+import threading
+
+from atomic_file import write_json_atomic
+
+class MappedGzipReader(gzip.GzipFile):
+    """GzipFile reading from a memory-mapped file, closing the mapping with it"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(fileobj=self._mapped, mode='rb')
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if not self._mapped.closed:
+                self._mapped.close()
+
+class PendingObject:
+    """A file being written into the store; compressed and hashed as it is written"""
+
+    def __init__(self, store):
+        self.store = store
+        self.digest = hashlib.sha256()
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.objects_dir, suffix='.part')
+        self._raw = os.fdopen(fd, 'wb')
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=6, mtime=0)
+
+    def write(self, chunk):
+        self._gzip.write(chunk)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """Move the compressed file into place under its hash; returns the hash"""
+        self._gzip.close()
+        self._raw.close()
+        sha256 = self.digest.hexdigest()
+        object_path = self.store.object_path(sha256)
+        if os.path.exists(object_path):
+            # Same bytes already stored (another release or package)
+            os.unlink(self.tmp_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(self.tmp_path, object_path)
+        return sha256
+
+    def discard(self):
+        self._gzip.close()
+        self._raw.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+class XmlStore:
+    def __init__(self, root='xml'):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        self.lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.load_index()
+
+    def load_index(self):
+        """Load tp_code -> {filename: {sha256, size}} from disk"""
+        try:
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+        except ValueError:
+            print(f"Warning: Could not read XML store index {self.index_path}, starting a new one")
+            self.index = {}
+
+    def save_index(self):
+        """Write the index atomically (temp file then rename)"""
+        with self.lock:
+            write_json_atomic(self.index_path, self.index, sort_keys=True)
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}.xml.gz")
+
+    def begin_write(self):
+        """Start writing a new object; call commit() or discard() on the result"""
+        return PendingObject(self)
+
+    def add(self, tp_code, filename, sha256, size):
+        """Point tp_code/filename at a stored object"""
+        with self.lock:
+            self.index.setdefault(tp_code, {})[filename] = {'sha256': sha256, 'size': size}
+
+    def lookup(self, tp_code, filename):
+        """Index entry for tp_code/filename if its object is present, else None"""
+        with self.lock:
+            entry = self.index.get(tp_code, {}).get(filename)
+        if entry and os.path.exists(self.object_path(entry['sha256'])):
+            return entry
+        return None
+
+    def retain(self, tp_code, filenames):
+        """Drop index entries for a package's files that are no longer current"""
+        with self.lock:
+            files = self.index.get(tp_code, {})
+            for filename in list(files):
+                if filename not in filenames:
+                    del files[filename]
+
+    def put_file(self, tp_code, filename, path):
+        """Copy an existing uncompressed file into the store; returns the hash"""
+        pending = self.begin_write()
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    pending.write(chunk)
+        except Exception:
+            pending.discard()
+            raise
+        sha256 = pending.commit()
+        self.add(tp_code, filename, sha256, pending.size)
+        return sha256
+
+    def package_files(self, tp_code):
+        """
+        Keys ("tp_code/filename") of a package's XML files.
+        Packages downloaded before the store existed fall back to the plain files in xml/{tp_code}/.
+        """
+        with self.lock:
+            filenames = sorted(self.index.get(tp_code, {}))
+        if not filenames:
+            package_dir = os.path.join(self.root, tp_code)
+            if os.path.isdir(package_dir):
+                filenames = sorted(
+                    name for name in os.listdir(package_dir) if name.lower().endswith('.xml')
+                )
+        return [f"{tp_code}/{filename}" for filename in filenames]
+
+    def open(self, key):
+        """Open a stored file for streaming reads (use as a context manager)"""
+        tp_code, filename = key.split('/', 1)
+        entry = self.lookup(tp_code, filename)
+        if entry:
+            return MappedGzipReader(self.object_path(entry['sha256']))
+        return open(os.path.join(self.root, tp_code, filename), 'rb')
+
+    def migrate_plain_files(self):
+        """Move plain xml/{tp_code}/*.xml files into the store"""
+        moved = 0
+        for tp_code in sorted(os.listdir(self.root)):
+            package_dir = os.path.join(self.root, tp_code)
+            if tp_code == 'objects' or not os.path.isdir(package_dir):
+                continue
+            for filename in sorted(os.listdir(package_dir)):
+                if not filename.lower().endswith('.xml'):
+                    continue
+                path = os.path.join(package_dir, filename)
+                self.put_file(tp_code, filename, path)
+                os.unlink(path)
+                moved += 1
+            if not os.listdir(package_dir):
+                os.rmdir(package_dir)
+        self.save_index()
+        return moved
+
+    def prune(self):
+        """Delete stored objects no longer referenced by the index"""
+        with self.lock:
+            referenced = {
+                entry['sha256'] for files in self.index.values() for entry in files.values()
+            }
+        removed = 0
+        for dirpath, _, names in os.walk(self.objects_dir):
+            for name in names:
+                if name.endswith('.xml.gz') and name[:-len('.xml.gz')] not in referenced:
+                    os.unlink(os.path.join(dirpath, name))
+                    removed += 1
+        return removed
+
+if __name__ == "__main__":
+    store = XmlStore()
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'migrate':
+        print(f"Moved {store.migrate_plain_files()} plain XML files into the store")
+    elif command == 'prune':
+        print(f"Removed {store.prune()} unreferenced objects")
+    else:
+        print("Usage: python xml_store.py [migrate|prune]")
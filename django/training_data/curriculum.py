@@ -0,0 +1,74 @@
+# ===============================
+# training_data/curriculum.py
+# ===============================
+import hashlib
+import json
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from .models import TrainingPackage, TrainingUnit
+
+# Bumped by signals.py whenever a package or unit is saved or deleted; cached
+# trees are stored under the current version, so a bump retires all of them
+VERSION_KEY = 'curriculum:version'
+CURRICULUM_CACHE_TIMEOUT = 60 * 60 * 24
+
+def curriculum_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+def bump_curriculum_version():
+    cache.add(VERSION_KEY, 1, timeout=None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+def load_curriculum(package_id):
+    """Package and its ordered units in two queries; raises TrainingPackage.DoesNotExist"""
+    return TrainingPackage.objects.prefetch_related(
+        Prefetch('trainingunit_set', queryset=TrainingUnit.objects.order_by('order'))
+    ).get(pk=package_id)
+
+def curriculum_tree(package):
+    """JSON-ready tree for a package loaded by load_curriculum"""
+    return {
+        'id': package.pk,
+        'name': package.name,
+        'description': package.description,
+        'difficulty_level': package.difficulty_level,
+        'estimated_duration': package.estimated_duration,
+        'is_active': package.is_active,
+        'units': [
+            {
+                'id': unit.pk,
+                'name': unit.name,
+                'content': unit.content,
+                'order': unit.order,
+                'points_value': unit.points_value,
+            }
+            for unit in package.trainingunit_set.all()
+        ],
+    }
+
+def get_curriculum(package_id):
+    """
+    Cached curriculum tree for a package
+    Returns dict: {'etag': ..., 'data': ...}; raises TrainingPackage.DoesNotExist
+    """
+    version = curriculum_version()
+    key = f'curriculum:package:{package_id}'
+    entry = cache.get(key, version=version)
+    if entry is None:
+        data = curriculum_tree(load_curriculum(package_id))
+        body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+        entry = {
+            'etag': '"{}"'.format(hashlib.md5(body.encode('utf-8')).hexdigest()),
+            'data': data,
+        }
+        cache.set(key, entry, CURRICULUM_CACHE_TIMEOUT, version=version)
+    return entry
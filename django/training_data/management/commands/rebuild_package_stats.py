@@ -0,0 +1,14 @@
+# ===============================
+# training_data/management/commands/rebuild_package_stats.py
+# ===============================
+from django.core.management.base import BaseCommand
+from training_data.stats import rebuild_package_stats
+
+class Command(BaseCommand):
+    help = 'Recompute unit count, points and duration for every training package (run after bulk imports)'
+    
+    def handle(self, *args, **options):
+        count = rebuild_package_stats()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt stats for {count} training packages")
+        )
@@ -0,0 +1,24 @@
+# ===============================
+# training_data/management/commands/sync_training_data.py
+# ===============================
+from django.core.management.base import BaseCommand
+from training_data.tasks import process_training_packages, update_and_process
+
+class Command(BaseCommand):
+    help = 'Queue a training package sync and per-package import on the Celery workers'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('codes', nargs='?', help='Comma-separated tpCodes (default: the selected packages)')
+        parser.add_argument('--full', action='store_true', help='Request the full training package list')
+        parser.add_argument('--skip-sync', action='store_true', help='Only import packages already in lol_tps')
+    
+    def handle(self, *args, **options):
+        tp_codes = options['codes'].split(',') if options['codes'] else None
+        
+        if options['skip_sync']:
+            result = process_training_packages.delay(tp_codes)
+        else:
+            result = update_and_process.delay(options['full'], tp_codes)
+        self.stdout.write(
+            self.style.SUCCESS(f"Queued training package update (task {result.id})")
+        )
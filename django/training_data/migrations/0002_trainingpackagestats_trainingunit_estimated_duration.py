@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:12
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training_data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingPackageStats',
+            fields=[
+                ('package', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='training_data.trainingpackage')),
+                ('unit_count', models.IntegerField(default=0)),
+                ('total_points', models.IntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trainingunit',
+            name='estimated_duration',
+            field=models.DurationField(blank=True, null=True),
+        ),
+    ]
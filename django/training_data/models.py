@@ -2,8 +2,10 @@
 # training_data/models.py
 # ===============================
 from django.db import models
+from model_utils import FieldTracker
 from model_utils.models import TimeStampedModel
 import json
+from datetime import timedelta
 
 class TrainingPackage(TimeStampedModel):
     name = models.CharField(max_length=200)
@@ -26,9 +28,26 @@ class TrainingUnit(TimeStampedModel):
     content = models.TextField()
     order = models.IntegerField()
     points_value = models.IntegerField(default=10)
+    estimated_duration = models.DurationField(null=True, blank=True)
+    
+    # Lets signals.py refresh the old package's stats when a unit moves
+    tracker = FieldTracker(fields=['package'])
     
     class Meta:
         ordering = ['order']
     
     def __str__(self):
-        return f"{self.package.name} - {self.name}"
\ No newline at end of file
+        return f"{self.package.name} - {self.name}"
+
+class TrainingPackageStats(models.Model):
+    """
+    Unit aggregates for a package, kept current by signals.py as units change.
+    Rebuild with `manage.py rebuild_package_stats` after bulk imports.
+    """
+    package = models.OneToOneField(TrainingPackage, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    unit_count = models.IntegerField(default=0)
+    total_points = models.IntegerField(default=0)
+    total_duration = models.DurationField(default=timedelta)
+    
+    def __str__(self):
+        return f"{self.package_id}: {self.unit_count} units, {self.total_points} points"
\ No newline at end of file
@@ -0,0 +1,47 @@
+# ===============================
+# training_data/packaging.py
+# ===============================
+from django.db import connection
+
+# lol_qual_units is written by scripts/tga_importer.py (see tga_importer.md).
+# Its primary key (qualCode, unitCode) answers qualification -> units and the
+# unitQual index (unitCode, qualCode) answers unit -> qualifications, so each
+# direction is one indexed query. Titles are joined on the unique code keys.
+# The results aren't cached: the importer runs outside Django and couldn't
+# invalidate them, and the lookups are cheap enough to run every time.
+QUALIFICATION_UNITS_QUERY = """
+    SELECT qu.unitCode, u.unitTitle, qu.isCore, u.tpCode
+    FROM lol_qual_units qu
+    LEFT JOIN lol_units u ON u.unitCode = qu.unitCode
+    WHERE qu.qualCode = %s
+    ORDER BY qu.isCore DESC, qu.unitCode
+"""
+
+UNIT_QUALIFICATIONS_QUERY = """
+    SELECT qu.qualCode, q.qualTitle, qu.isCore, qu.tpCode
+    FROM lol_qual_units qu
+    LEFT JOIN lol_quals q ON q.qualCode = qu.qualCode
+    WHERE qu.unitCode = %s
+    ORDER BY qu.qualCode
+"""
+
+def _rows(query, code):
+    with connection.cursor() as cursor:
+        cursor.execute(query, [code])
+        return cursor.fetchall()
+
+def units_for_qualification(qual_code):
+    """Units packaged in a qualification, core units first"""
+    rows = _rows(QUALIFICATION_UNITS_QUERY, qual_code)
+    return [
+        {'code': code, 'title': title, 'core': bool(is_core), 'tp_code': tp_code}
+        for code, title, is_core, tp_code in rows
+    ]
+
+def qualifications_for_unit(unit_code):
+    """Qualifications that include a unit, from any training package that imports it"""
+    rows = _rows(UNIT_QUALIFICATIONS_QUERY, unit_code)
+    return [
+        {'code': code, 'title': title, 'core': bool(is_core), 'tp_code': tp_code}
+        for code, title, is_core, tp_code in rows
+    ]
@@ -0,0 +1,67 @@
+# ===============================
+# training_data/search.py
+# ===============================
+import re
+from django.db import connection
+
+# lol_search is maintained by scripts/tga_importer.py (see tga_importer.md):
+# one row per unit of competency with its title and element/PC text, under
+# FULLTEXT indexes on (unitTitle) and (unitTitle, body).
+SEARCH_QUERY = """
+    SELECT unitCode, unitTitle, tpCode,
+           MATCH(unitTitle) AGAINST (%s IN BOOLEAN MODE) * %s
+           + MATCH(unitTitle, body) AGAINST (%s IN BOOLEAN MODE) AS score
+    FROM lol_search
+    WHERE MATCH(unitTitle, body) AGAINST (%s IN BOOLEAN MODE)
+    ORDER BY score DESC, unitCode
+    LIMIT %s OFFSET %s
+"""
+
+COUNT_QUERY = """
+    SELECT COUNT(*) FROM lol_search
+    WHERE MATCH(unitTitle, body) AGAINST (%s IN BOOLEAN MODE)
+"""
+
+# Title matches count this many times more than matches in element/PC text
+TITLE_WEIGHT = 3
+
+MAX_TERMS = 8
+
+# Words shorter than innodb_ft_min_token_size are not indexed, so requiring them would match nothing
+MIN_TERM_LENGTH = 3
+
+def boolean_query(text):
+    """
+    Turn free text into a BOOLEAN MODE query: every word is required and
+    matched as a prefix ("food saf" -> +food* +saf*), and the whole input is
+    added as an optional phrase so exact phrases rank higher.
+    Returns '' if the text has no searchable words.
+    """
+    terms = [term for term in re.findall(r'\w+', text.lower()) if len(term) >= MIN_TERM_LENGTH][:MAX_TERMS]
+    if not terms:
+        return ''
+    query = ' '.join(f'+{term}*' for term in terms)
+    if len(terms) > 1:
+        query += ' "{}"'.format(' '.join(terms))
+    return query
+
+def search_units(text, limit=20, offset=0):
+    """
+    Ranked full-text search over units of competency.
+    Returns tuple: (total matches, list of {code, title, tp_code, score})
+    """
+    query = boolean_query(text)
+    if not query:
+        return 0, []
+
+    with connection.cursor() as cursor:
+        cursor.execute(COUNT_QUERY, [query])
+        total = cursor.fetchone()[0]
+        if not total:
+            return 0, []
+        cursor.execute(SEARCH_QUERY, [query, TITLE_WEIGHT, query, query, limit, offset])
+        results = [
+            {'code': code, 'title': title, 'tp_code': tp_code, 'score': float(score)}
+            for code, title, tp_code, score in cursor.fetchall()
+        ]
+    return total, results
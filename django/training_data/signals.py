@@ -0,0 +1,34 @@
+# ===============================
+# training_data/signals.py
+# ===============================
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .curriculum import bump_curriculum_version
+from .models import TrainingPackage, TrainingPackageStats, TrainingUnit
+from .stats import refresh_package_stats
+
+@receiver([post_save, post_delete], sender=TrainingPackage)
+@receiver([post_save, post_delete], sender=TrainingUnit)
+def invalidate_curriculum(sender, **kwargs):
+    """Retire every cached curriculum tree"""
+    bump_curriculum_version()
+
+@receiver(post_save, sender=TrainingPackage)
+def create_package_stats(sender, instance, created, **kwargs):
+    if created:
+        TrainingPackageStats.objects.get_or_create(package=instance)
+
+@receiver(post_save, sender=TrainingUnit)
+def unit_saved(sender, instance, **kwargs):
+    """Refresh the unit's package, and the package it moved from if it moved"""
+    refresh_package_stats(instance.package_id)
+    previous = instance.tracker.previous('package')
+    if previous is not None and previous != instance.package_id:
+        refresh_package_stats(previous)
+
+@receiver(post_delete, sender=TrainingUnit)
+def unit_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting the package cascades to its units and its stats; nothing to refresh
+    if isinstance(origin, TrainingPackage):
+        return
+    refresh_package_stats(instance.package_id)
@@ -0,0 +1,49 @@
+# ===============================
+# training_data/stats.py
+# ===============================
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Sum
+from .models import TrainingPackage, TrainingPackageStats, TrainingUnit
+
+AGGREGATES = {
+    'unit_count': Count('id'),
+    'total_points': Sum('points_value'),
+    'total_duration': Sum('estimated_duration'),
+}
+
+def _stats_values(totals):
+    return {
+        'unit_count': totals.get('unit_count') or 0,
+        'total_points': totals.get('total_points') or 0,
+        'total_duration': totals.get('total_duration') or timedelta(),
+    }
+
+def refresh_package_stats(package_id):
+    """Recompute one package's stats; one aggregate over its units via the package_id index"""
+    if not TrainingPackage.objects.filter(pk=package_id).exists():
+        return None
+    totals = TrainingUnit.objects.filter(package_id=package_id).aggregate(**AGGREGATES)
+    stats, _ = TrainingPackageStats.objects.update_or_create(
+        package_id=package_id, defaults=_stats_values(totals)
+    )
+    return stats
+
+@transaction.atomic
+def rebuild_package_stats():
+    """Recompute every package's stats with one grouped aggregate; returns the number of packages"""
+    totals = {
+        row['package_id']: row
+        for row in TrainingUnit.objects.order_by().values('package_id').annotate(**AGGREGATES)
+    }
+    rows = [
+        TrainingPackageStats(package_id=package_id, **_stats_values(totals.get(package_id, {})))
+        for package_id in TrainingPackage.objects.values_list('pk', flat=True)
+    ]
+    TrainingPackageStats.objects.all().delete()
+    TrainingPackageStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+def packages_with_stats():
+    """Every package joined to its stats row on the primary key in one query"""
+    return TrainingPackage.objects.select_related('stats')
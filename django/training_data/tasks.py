@@ -0,0 +1,139 @@
+# ===============================
+# training_data/tasks.py
+# ===============================
+# Celery versions of the admin_update_manager.py stages (scripts/). A run
+# syncs the training package list, then fans out one import_package task per
+# package and fans back in to finish_processing once every package has
+# succeeded or used up its retries.
+#
+# The scripts keep their state (update_config.json, the xml/ store and its
+# manifest) in files relative to the working directory, so workers run from
+# django/scripts (see docker-compose.yaml). Tasks that download XML or write
+# update_config.json go to the single-process tga_sync queue
+# (CELERY_TASK_ROUTES) so those files only ever have one writer; the
+# per-package imports only read the store and can run on any number of workers.
+import os
+import sys
+from datetime import datetime
+from celery import chord, shared_task
+from django.conf import settings
+
+SCRIPTS_DIR = os.path.join(settings.BASE_DIR, 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# Seconds before the first retry of a failed package import, doubled each time
+IMPORT_RETRY_DELAY = 30
+
+def _manager():
+    # Imported here so the web process never loads the scripts or their drivers
+    from admin_update_manager import UpdateManager
+    return UpdateManager()
+
+def _reload_download_state():
+    """
+    Start a download run: re-read the XML store index and manifest, which may
+    have changed since this worker imported update_tps, and forget the paths
+    fetched by earlier tasks so each file gets its conditional GET again
+    """
+    import update_tps
+    update_tps.store.load_index()
+    update_tps.manifest.load()
+    update_tps.reset_run_state()
+
+@shared_task
+def sync_training_packages(full=False):
+    """Search TGA and upsert lol_tps, downloading XML for changed packages; returns True on success"""
+    _reload_download_state()
+    return _manager().update_training_packages(full)
+
+@shared_task(bind=True, max_retries=3)
+def import_package(self, tp_code, record_types, batch_size=50):
+    """
+    Import one package's XML from the store, retrying database errors. Any
+    other error won't go away on a retry and fails the package straight away:
+    a corrupt store object or bad XML raises PackageParseError, after the
+    importer has rolled the package back. Either way a result is returned, so
+    one bad package can't stop the chord's finish_processing from running.
+    """
+    import mysql.connector
+    from db_pool import get_connection
+    from tga_importer import import_training_package, package_xml_files
+
+    try:
+        if not package_xml_files(tp_code):
+            return {'tp_code': tp_code, 'ok': False, 'error': 'no XML files in the xml store'}
+        cnx = get_connection()
+        try:
+            counts = import_training_package(cnx, tp_code, record_types, batch_size)
+        finally:
+            cnx.close()
+    except mysql.connector.Error as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=IMPORT_RETRY_DELAY * 2 ** self.request.retries)
+        return {'tp_code': tp_code, 'ok': False, 'error': str(e)}
+    except Exception as e:
+        return {'tp_code': tp_code, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    return {'tp_code': tp_code, 'ok': True, 'counts': counts}
+
+@shared_task
+def finish_processing(results):
+    """
+    Chord callback: mark the imported packages processed and, if none failed,
+    record last_full_update in update_config.json
+    """
+    manager = _manager()
+    completed = [result['tp_code'] for result in results if result['ok']]
+    failed = {result['tp_code']: result['error'] for result in results if not result['ok']}
+
+    manager.mark_packages_processed(completed)
+    for tp_code, error in failed.items():
+        print(f"{tp_code} failed: {error}")
+
+    if not failed:
+        manager.config['last_full_update'] = datetime.now().isoformat()
+        manager.save_config()
+    print(f"Processed {len(completed)} of {len(results)} training packages")
+    return {'completed': completed, 'failed': failed}
+
+@shared_task
+def process_training_packages(tp_codes=None):
+    """
+    Fan out an import_package task per package (the selected packages by
+    default). XML missing from the store is downloaded here first, in this
+    one process. Returns the id of the chord's result, or None if there is
+    nothing to do.
+    """
+    from admin_update_manager import PROCESS_STAGES, STAGE_RECORD_TYPES
+    from tga_importer import package_xml_files
+
+    manager = _manager()
+    tp_codes = tp_codes or manager.config.get('selected_training_packages', [])
+    if not tp_codes:
+        print("No training packages selected")
+        return None
+
+    update_settings = manager.config.get('update_settings', {})
+    record_types = [
+        record_type
+        for stage, flag, _ in PROCESS_STAGES if update_settings.get(flag, True)
+        for record_type in STAGE_RECORD_TYPES[stage]
+    ]
+    batch_size = update_settings.get('batch_size', 50)
+
+    missing = [code for code in tp_codes if not package_xml_files(code)]
+    if missing and update_settings.get('download_xml', True):
+        _reload_download_state()
+        from update_tps import download_xml_files_concurrent
+        for _ in download_xml_files_concurrent(missing, max_workers=update_settings.get('max_download_workers', 8)):
+            pass
+
+    header = [import_package.s(code, record_types, batch_size) for code in tp_codes]
+    return chord(header)(finish_processing.s()).id
+
+@shared_task
+def update_and_process(full=False, tp_codes=None):
+    """Sync the training package list, then process the packages if the sync succeeded"""
+    if not sync_training_packages(full):
+        return None
+    return process_training_packages(tp_codes)
@@ -1,3 +1,191 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+import mysql.connector
 from django.test import TestCase
+from lol.celery import app as celery_app
+from training_data import tasks
+# tasks puts the update scripts on sys.path
+import tga_importer
+from tga_importer import PackageParseError, import_training_package, import_training_packages
+from xml_store import XmlStore
 
-# Create your tests here.
+UNIT_COUNT = 20000
+
+def package_xml(tp_code):
+    """Enough units that a truncated copy fails part way through the parse"""
+    units = ''.join(f'<Unit><Code>{tp_code}{i}</Code><Title>Unit {i}</Title></Unit>' for i in range(UNIT_COUNT))
+    return f'<?xml version="1.0"?><TrainingPackage>{units}</TrainingPackage>'.encode()
+
+def store_package(xml_dir, tp_code, truncate=False):
+    """
+    Put a package's XML into an XML store, optionally cutting its compressed
+    object in half. Objects are content-addressed, so each package's XML differs.
+    """
+    store = XmlStore(xml_dir)
+    xml = package_xml(tp_code)
+    pending = store.begin_write()
+    pending.write(xml)
+    sha256 = pending.commit()
+    store.add(tp_code, f"{tp_code.lower()}.xml", sha256, len(xml))
+    store.save_index()
+    if truncate:
+        path = store.object_path(sha256)
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.chmod(path, 0o644)
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+
+class FakeConnection:
+    """Holds executed statements until commit, and drops them on rollback, like a transaction"""
+
+    def __init__(self):
+        self.pending = []
+        self.committed = []
+        self.rolled_back = False
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed += self.pending
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+class FakeCursor:
+    def __init__(self, cnx):
+        self.cnx = cnx
+
+    def execute(self, query, params=None):
+        self.cnx.pending.append(query)
+
+    def executemany(self, query, rows):
+        self.cnx.pending.append(query)
+
+    def close(self):
+        pass
+
+class ImportTrainingPackageTests(TestCase):
+    """The streaming importer against a real XML store and a fake database"""
+
+    def setUp(self):
+        self.xml_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.xml_dir)
+
+    def test_complete_package_committed(self):
+        store_package(self.xml_dir, 'GOOD')
+        cnx = FakeConnection()
+        counts = import_training_package(cnx, 'GOOD', xml_dir=self.xml_dir)
+        self.assertEqual(counts['unit'], UNIT_COUNT)
+        self.assertTrue(any(query.startswith('DELETE') for query in cnx.committed))
+
+    def test_truncated_object_writes_nothing(self):
+        store_package(self.xml_dir, 'BAD', truncate=True)
+        cnx = FakeConnection()
+        with self.assertRaises(PackageParseError):
+            import_training_package(cnx, 'BAD', xml_dir=self.xml_dir)
+        # The package's deletes and partial inserts were rolled back, not committed
+        self.assertTrue(cnx.rolled_back)
+        self.assertEqual(cnx.committed, [])
+
+    def test_bad_package_skipped_and_left_for_next_run(self):
+        store_package(self.xml_dir, 'GOOD')
+        store_package(self.xml_dir, 'BAD', truncate=True)
+        committed = []
+        import_training_packages(
+            FakeConnection(), ['BAD', 'GOOD'], xml_dir=self.xml_dir,
+            on_committed=lambda tp_code, counts: committed.append(tp_code)
+        )
+        self.assertEqual(committed, ['GOOD'])
+
+class ProcessTrainingPackagesTests(TestCase):
+    """
+    The import chord, run eagerly with lol_tps stubbed out. CORRUPT goes through
+    the real importer, reading a truncated object from an XML store in the
+    working directory; the other packages use a stub importer.
+    """
+
+    def setUp(self):
+        # The app reads settings with the CELERY_ namespace, so its options take the prefixed names
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.CELERY_TASK_ALWAYS_EAGER = True
+        self.addCleanup(setattr, celery_app.conf, 'CELERY_TASK_ALWAYS_EAGER', eager)
+
+        self.manager = mock.MagicMock()
+        self.manager.config = {'selected_training_packages': [], 'update_settings': {'batch_size': 10}}
+        self.attempts = {}
+        self.connections = []
+
+        # The tasks read the store from xml/ under the working directory, as the workers do
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(work_dir)
+        store_package('xml', 'CORRUPT', truncate=True)
+
+        real_package_xml_files = tga_importer.package_xml_files
+        patches = [
+            mock.patch.object(tasks, '_manager', return_value=self.manager),
+            mock.patch.object(tasks, 'IMPORT_RETRY_DELAY', 0),
+            mock.patch(
+                'tga_importer.package_xml_files',
+                side_effect=lambda tp_code, *args: real_package_xml_files(tp_code, *args) if tp_code == 'CORRUPT'
+                else ['package.xml']
+            ),
+            mock.patch('tga_importer.import_training_package', side_effect=self.fake_import),
+            mock.patch('db_pool.get_connection', side_effect=self.connect),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def connect(self):
+        cnx = FakeConnection()
+        self.connections.append(cnx)
+        return cnx
+
+    def fake_import(self, cnx, tp_code, record_types, batch_size):
+        attempt = self.attempts[tp_code] = self.attempts.get(tp_code, 0) + 1
+        if tp_code == 'FLAKY' and attempt == 1:
+            raise mysql.connector.errors.OperationalError("Lost connection")
+        if tp_code == 'DOWN':
+            raise mysql.connector.errors.OperationalError("Server has gone away")
+        if tp_code == 'CORRUPT':
+            return import_training_package(cnx, tp_code, record_types, batch_size)
+        return {'units': 3}
+
+    def run_chord(self, tp_codes):
+        tasks.process_training_packages.delay(tp_codes)
+        self.manager.mark_packages_processed.assert_called_once()
+        return self.manager.mark_packages_processed.call_args.args[0]
+
+    def test_all_packages_imported(self):
+        completed = self.run_chord(['AAA', 'BBB'])
+        self.assertEqual(completed, ['AAA', 'BBB'])
+        self.manager.save_config.assert_called_once()
+        self.assertIn('last_full_update', self.manager.config)
+
+    def test_retry_then_success(self):
+        completed = self.run_chord(['FLAKY', 'AAA'])
+        self.assertEqual(completed, ['FLAKY', 'AAA'])
+        self.assertEqual(self.attempts['FLAKY'], 2)
+
+    def test_failures_still_reach_finish_processing(self):
+        completed = self.run_chord(['AAA', 'DOWN', 'CORRUPT'])
+        self.assertEqual(completed, ['AAA'])
+        # Database errors use up every retry; a corrupt store object isn't retried
+        self.assertEqual(self.attempts['DOWN'], tasks.import_package.max_retries + 1)
+        self.assertEqual(self.attempts['CORRUPT'], 1)
+        corrupt = [cnx for cnx in self.connections if cnx.rolled_back]
+        self.assertEqual(len(corrupt), 1)
+        self.assertEqual(corrupt[0].committed, [])
+        # A failed package keeps last_full_update from moving
+        self.manager.save_config.assert_not_called()